@@ -1,20 +1,94 @@
-from uuid import UUID
+from datetime import datetime
+from uuid import NAMESPACE_URL, UUID, uuid5
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
 from models import PriceData
 
+OHLCV = ["open", "high", "low", "close", "volume"]
+CHUNK_ROWS = 5000
 
-def save_prices(session, df, instrument_id:UUID):
-    objects = []
 
-    for timestamp, row in df.iterrows():
-        obj = PriceData(
-            instrument_id =instrument_id,
-            timestamp = timestamp.to_pydatetime(),
-            open = float(row["Open"]),
-            close = float(row["Close"])
-        )
-        objects.append(obj)
+def instrument_id_for(symbol: str) -> UUID:
+    """Stable id per symbol, so loading a symbol twice updates the same rows."""
+    return uuid5(NAMESPACE_URL, f"instrument:{symbol.strip().upper()}")
 
-        session.bulk_save_objects(objects)
+
+def _price_rows(df: pd.DataFrame, instrument_id: UUID, interval: str) -> list[dict]:
+    """One dict per bar with full OHLCV; timestamps as naive UTC, NaN as NULL."""
+    if isinstance(df.columns, pd.MultiIndex):
+        # yf.download returns (Price, Ticker) columns
+        df = df.droplevel(-1, axis=1)
+    df = df.rename(columns=lambda c: str(c).lower())
+    frame = df.reindex(columns=OHLCV).astype(float)
+    frame = frame[~frame.index.duplicated(keep="last")]
+
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    frame.index = index
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    frame.insert(0, "timestamp", index.to_pydatetime())
+    frame.insert(0, "interval", interval)
+    frame.insert(0, "instrument_id", instrument_id)
+    return frame.to_dict("records")
+
+
+def save_prices_many(session, frames: dict[UUID, pd.DataFrame], interval: str = "1d") -> int:
+    """Upsert the bars of several instruments in one transaction; returns the number of rows written.
+
+    Rows are sent as multi-row INSERT ... ON CONFLICT (instrument_id, interval, timestamp) DO UPDATE
+    statements, so loading the same bars again is a no-op apart from corrections.
+    """
+    stmt = insert(PriceData)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PriceData.instrument_id, PriceData.interval, PriceData.timestamp],
+        set_={c: stmt.excluded[c] for c in OHLCV},
+    )
+    written = 0
+    try:
+        for instrument_id, df in frames.items():
+            if df is None or len(df) == 0:
+                continue
+            rows = _price_rows(df, instrument_id, interval)
+            for i in range(0, len(rows), CHUNK_ROWS):
+                session.execute(stmt, rows[i:i + CHUNK_ROWS])
+            written += len(rows)
         session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return written
+
+
+def save_prices(session, df, instrument_id:UUID, interval: str = "1d"):
+    return save_prices_many(session, {instrument_id: df}, interval)
+
+
+def latest_timestamps(session, instrument_ids: list[UUID], interval: str = "1d") -> dict[UUID, datetime]:
+    """Newest stored bar (naive UTC) per instrument; instruments without bars are missing."""
+    rows = session.execute(
+        select(PriceData.instrument_id, func.max(PriceData.timestamp))
+        .where(PriceData.instrument_id.in_(instrument_ids), PriceData.interval == interval)
+        .group_by(PriceData.instrument_id)
+    )
+    return {iid: ts for iid, ts in rows}
+
 
+def read_prices(session, instrument_ids: list[UUID], interval: str, start: datetime | None, end: datetime | None):
+    """Rows (instrument_id, timestamp, OHLCV) in [start, end) (naive UTC), ordered by instrument and time.
 
+    The filter matches the primary key (instrument_id, interval, timestamp), so
+    Postgres answers it with range scans of the key's index.
+    """
+    query = (
+        select(PriceData.instrument_id, PriceData.timestamp, *(getattr(PriceData, c) for c in OHLCV))
+        .where(PriceData.instrument_id.in_(instrument_ids), PriceData.interval == interval)
+        .order_by(PriceData.instrument_id, PriceData.timestamp)
+    )
+    if start is not None:
+        query = query.where(PriceData.timestamp >= start)
+    if end is not None:
+        query = query.where(PriceData.timestamp < end)
+    return session.execute(query).all()
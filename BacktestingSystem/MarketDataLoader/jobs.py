@@ -0,0 +1,147 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+from uuid import UUID, uuid4
+
+import pandas as pd
+
+from crud import instrument_id_for, latest_timestamps, save_prices
+from yfinance_client import fetch_prices
+
+
+def update_symbol(session, symbol: str, interval: str) -> int:
+    """Fetch and upsert the bars of one symbol newer than what is stored; returns rows written.
+
+    The newest stored bar is fetched again, since it may have been written
+    while its session was still open.
+    """
+    instrument_id = instrument_id_for(symbol)
+    latest = latest_timestamps(session, [instrument_id], interval).get(instrument_id)
+    start = None if latest is None else pd.Timestamp(latest, tz="UTC")
+    data = fetch_prices(symbol, interval, start=None if start is None else start.date())
+    if data is None or len(data) == 0:
+        return 0
+    if start is not None:
+        index = pd.DatetimeIndex(data.index)
+        index = index.tz_convert("UTC") if index.tz is not None else index.tz_localize("UTC")
+        data = data[index >= start]
+    return save_prices(session, data, instrument_id=instrument_id, interval=interval)
+
+
+@dataclass
+class Job:
+    id: UUID
+    interval: str
+    symbols: list[str]
+    # symbols already queued or running in another job, with that job's id
+    deduplicated: dict[str, str] = field(default_factory=dict)
+    results: dict[str, dict] = field(default_factory=dict)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "failed" if any(r["status"] == "failed" for r in self.results.values()) else "done"
+        return "running" if any(r["status"] != "queued" for r in self.results.values()) else "queued"
+
+    def to_dict(self) -> dict:
+        counts: dict[str, int] = {}
+        for r in self.results.values():
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        return {
+            "id": str(self.id),
+            "status": self.status,
+            "interval": self.interval,
+            "symbols": len(self.symbols),
+            "counts": counts,
+            "rows": sum(r.get("rows", 0) for r in self.results.values()),
+            "deduplicated": self.deduplicated,
+            "results": self.results,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": None if self.finished_at is None else self.finished_at.isoformat(),
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobManager:
+    """Runs batch price updates on a bounded thread pool.
+
+    Each symbol of a job is one task with its own session. A symbol that is
+    already queued or running (for the same interval) is not queued again.
+    At most max_pending symbols wait at once; beyond that submit() raises
+    QueueFull. The last `keep_jobs` jobs stay queryable. on_update(symbol) is
+    called after new bars of a symbol were written.
+    """
+
+    def __init__(self, session_factory, max_workers: int = 4, max_pending: int = 20_000, keep_jobs: int = 1000,
+                 on_update: Callable[[str], None] | None = None):
+        self.session_factory = session_factory
+        self.on_update = on_update
+        self.max_pending = max_pending
+        self.keep_jobs = keep_jobs
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="price-update")
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[UUID, Job] = OrderedDict()
+        self._in_flight: dict[tuple[str, str], UUID] = {}
+        self._remaining: dict[UUID, int] = {}
+
+    def submit(self, symbols: list[str], interval: str = "1d") -> Job:
+        wanted = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        job = Job(id=uuid4(), interval=interval, symbols=wanted)
+        with self._lock:
+            todo = []
+            for s in wanted:
+                other = self._in_flight.get((s, interval))
+                if other is not None:
+                    job.deduplicated[s] = str(other)
+                else:
+                    todo.append(s)
+            if len(self._in_flight) + len(todo) > self.max_pending:
+                raise QueueFull(f"{len(self._in_flight)} symbols pending, limit {self.max_pending}")
+            for s in todo:
+                self._in_flight[(s, interval)] = job.id
+                job.results[s] = {"status": "queued"}
+            if todo:
+                self._remaining[job.id] = len(todo)
+            else:
+                job.finished_at = datetime.now(timezone.utc)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep_jobs:
+                self._jobs.popitem(last=False)
+        for s in todo:
+            self._pool.submit(self._run, job, s)
+        return job
+
+    def get(self, job_id: UUID) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, symbol: str) -> None:
+        job.results[symbol] = {"status": "running"}
+        session = self.session_factory()
+        try:
+            rows = update_symbol(session, symbol, job.interval)
+            result = {"status": "done", "rows": rows}
+            if rows and self.on_update is not None:
+                self.on_update(symbol)
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+        finally:
+            session.close()
+        with self._lock:
+            job.results[symbol] = result
+            self._in_flight.pop((symbol, job.interval), None)
+            self._remaining[job.id] -= 1
+            if self._remaining[job.id] == 0:
+                del self._remaining[job.id]
+                job.finished_at = datetime.now(timezone.utc)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
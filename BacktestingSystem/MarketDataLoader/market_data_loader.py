@@ -1,13 +1,55 @@
-from fastapi import FastAPI
+from uuid import UUID
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from db import SessionLocal
-from yfinance_client import fetch_prices
-from crud import save_prices
+from crud import instrument_id_for
+from jobs import JobManager, QueueFull, update_symbol
+from prices import ARROW_STREAM, ResponseCache, parse_symbols, price_table, to_arrow, to_json, to_utc
 from db import engine
 from models import Base
-from uuid import uuid4
 
 app = FastAPI()
 Base.metadata.create_all(bind=engine)
+cache = ResponseCache()
+jobs = JobManager(SessionLocal, on_update=cache.invalidate)
+
+STREAM_CHUNK = 2**20
+
+
+class BatchUpdate(BaseModel):
+    symbols: list[str]
+    interval: str = "1d"
+
+
+def _price_response(request: Request, symbols: tuple[str, ...], start, end, interval: str, format: str | None):
+    if not symbols:
+        raise HTTPException(status_code=400, detail="no symbols")
+    if format is None:
+        format = "json" if "application/json" in request.headers.get("accept", "") else "arrow"
+    if format not in ("arrow", "json"):
+        raise HTTPException(status_code=400, detail="format must be arrow or json")
+    try:
+        start_utc, end_utc = to_utc(start), to_utc(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    key = (symbols, start_utc, end_utc, interval, format)
+    body = cache.get(key)
+    if body is None:
+        generation = cache.generation(symbols)
+        session = SessionLocal()
+        try:
+            table = price_table(session, symbols, interval, start_utc, end_utc)
+        finally:
+            session.close()
+        body = to_arrow(table) if format == "arrow" else to_json(table)
+        cache.put(key, body, generation)
+
+    media_type = ARROW_STREAM if format == "arrow" else "application/json"
+    view = memoryview(body)
+    chunks = (view[i:i + STREAM_CHUNK] for i in range(0, len(body), STREAM_CHUNK))
+    return StreamingResponse(chunks, media_type=media_type, headers={"Content-Length": str(len(body))})
 
 # Get
 
@@ -15,19 +57,57 @@ Base.metadata.create_all(bind=engine)
 def list_routes():
     return [route.path for route in app.routes]
 
+
+@app.get("/api/v1/jobs/{job_id}")
+def job_status(job_id: UUID):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job.to_dict()
+
+
+@app.get("/api/v1/prices")
+def get_prices(request: Request, symbols: str, start: str | None = None, end: str | None = None,
+               interval: str = "1d", format: str | None = None):
+    return _price_response(request, parse_symbols(symbols), start, end, interval, format)
+
+
+@app.get("/api/v1/prices/cache")
+def price_cache_stats():
+    return cache.stats()
+
+
+@app.get("/api/v1/prices/{symbol}")
+def get_symbol_prices(request: Request, symbol: str, start: str | None = None, end: str | None = None,
+                      interval: str = "1d", format: str | None = None):
+    return _price_response(request, parse_symbols(symbol), start, end, interval, format)
+
 # Post
 
 
 
 @app.post("/api/v1/update/prices")
-def load_prices(symbol: str):
-    data = fetch_prices(symbol, "1d")
-
+def load_prices(symbol: str, interval: str = "1d"):
     session = SessionLocal()
     try:
-        save_prices(session, data, instrument_id=uuid4())
+        rows = update_symbol(session, symbol, interval)
     finally:
         session.close()
+    if rows:
+        cache.invalidate(symbol)
+
+    return {"status": "ok", "uuid": str(instrument_id_for(symbol)), "rows": rows}
+
+
+@app.post("/api/v1/update/prices/batch", status_code=202)
+def load_prices_batch(body: BatchUpdate):
+    try:
+        job = jobs.submit(body.symbols, body.interval)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": str(job.id), "status": job.status, "queued": list(job.results), "deduplicated": job.deduplicated}
 
-    return {"status": "ok", "uuid": str(uuid4())}
 
+@app.on_event("shutdown")
+def stop_jobs():
+    jobs.shutdown()
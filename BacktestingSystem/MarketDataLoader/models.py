@@ -1,5 +1,5 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, DateTime, Float
+from sqlalchemy import Column, DateTime, Float, String
 from uuid import uuid4
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -9,6 +9,10 @@ class PriceData(Base):
     __tablename__ = "price_data"
 
     instrument_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    interval = Column(String(8), primary_key=True, default="1d")
     timestamp = Column(DateTime, primary_key=True)
     open = Column(Float)
-    close = Column(Float)
\ No newline at end of file
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
@@ -0,0 +1,127 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from crud import OHLCV, instrument_id_for, read_prices
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+SCHEMA = pa.schema(
+    [("symbol", pa.string()), ("timestamp", pa.timestamp("us", tz="UTC"))]
+    + [(c, pa.float64()) for c in OHLCV]
+)
+BATCH_ROWS = 65_536
+
+
+def parse_symbols(symbols: str) -> tuple[str, ...]:
+    """Comma separated symbols, upper-cased, deduplicated and sorted (the cache key does not depend on order)."""
+    return tuple(sorted({s.strip().upper() for s in symbols.split(",") if s.strip()}))
+
+
+def to_utc(ts: str | None) -> datetime | None:
+    """ISO date or timestamp as naive UTC, like the timestamps in price_data."""
+    if ts is None:
+        return None
+    t = pd.Timestamp(ts)
+    if t.tz is not None:
+        t = t.tz_convert("UTC").tz_localize(None)
+    return t.to_pydatetime()
+
+
+def price_table(session, symbols: tuple[str, ...], interval: str, start: datetime | None, end: datetime | None) -> pa.Table:
+    """Bars of the symbols in [start, end) as one table sorted by symbol and time."""
+    by_id = {instrument_id_for(s): s for s in symbols}
+    rows = read_prices(session, list(by_id), interval, start, end)
+    cols = list(zip(*rows)) if rows else [()] * (2 + len(OHLCV))
+    table = pa.table(
+        [pa.array([by_id[i] for i in cols[0]], pa.string()), pa.array(cols[1], pa.timestamp("us"))]
+        + [pa.array(c, pa.float64()) for c in cols[2:]],
+        names=SCHEMA.names,
+    )
+    # price_data timestamps are naive UTC
+    return table.cast(SCHEMA).sort_by([("symbol", "ascending"), ("timestamp", "ascending")])
+
+
+def to_arrow(table: pa.Table) -> bytes:
+    """Arrow IPC stream of the table, in record batches of BATCH_ROWS rows."""
+    sink = io.BytesIO()
+    with ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+            writer.write_batch(batch)
+    return sink.getvalue()
+
+
+def to_json(table: pa.Table) -> bytes:
+    """{symbol: [{"timestamp": ISO UTC, "open": ..., ...}, ...]}; NaN as null."""
+    out: dict[str, list[dict]] = {}
+    frame = table.to_pandas()
+    frame["timestamp"] = frame["timestamp"].map(lambda t: t.isoformat())
+    frame = frame.astype(object).where(frame.notna(), None)
+    for symbol, part in frame.groupby("symbol", sort=False):
+        out[symbol] = part.drop(columns="symbol").to_dict("records")
+    return json.dumps(out).encode("utf-8")
+
+
+class ResponseCache:
+    """In-process LRU of encoded responses, bounded by entries and total bytes.
+
+    Keys start with the tuple of symbols; invalidate(symbol) drops every
+    entry that contains the symbol, so updated bars are never served stale.
+    It also bumps the symbol's generation: a response read before the update
+    but put after it is discarded (take generation() before the query).
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self._generations: dict[str, int] = {}
+
+    def get(self, key: tuple) -> bytes | None:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def generation(self, symbols: tuple[str, ...]) -> tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(s, 0) for s in symbols)
+
+    def put(self, key: tuple, body: bytes, generation: tuple[int, ...]) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if tuple(self._generations.get(s, 0) for s in key[0]) != generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+
+    def invalidate(self, symbol: str) -> None:
+        symbol = symbol.strip().upper()
+        with self._lock:
+            self._generations[symbol] = self._generations.get(symbol, 0) + 1
+            for key in [k for k in self._entries if symbol in k[0]]:
+                self.size -= len(self._entries.pop(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
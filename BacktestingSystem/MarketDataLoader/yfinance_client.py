@@ -1,4 +1,11 @@
 import yfinance as yf
 
-def fetch_prices(symbol, interval):
-    return yf.download(symbol, interval=interval)
\ No newline at end of file
+# yfinance only serves intraday bars for the last 730 days
+INTRADAY_PERIOD = "730d"
+
+def fetch_prices(symbol, interval, start=None):
+    """Bars of one symbol from start on (inclusive), or the whole available history."""
+    if start is not None:
+        return yf.download(symbol, interval=interval, start=start, progress=False)
+    period = "max" if interval in ("1d", "5d", "1wk", "1mo", "3mo") else INTRADAY_PERIOD
+    return yf.download(symbol, interval=interval, period=period, progress=False)
@@ -1,16 +1,98 @@
 from __future__ import annotations
 import logging
 from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import pytz
 from .config import AggregationConfig
 from .logging import log_kv
+from .profiling import profiled
 logger = logging.getLogger(__name__)
 
+_DAY_NS = 86_400 * 10**9
+_OHLCV = ("open", "high", "low", "close", "volume")
+
+
+@lru_cache(maxsize=None)
+def _tod_ns(hhmm: str) -> int:
+    """Wall-clock time of day as ns since midnight."""
+    t = pd.to_datetime(hhmm).time()
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 10**9 + t.microsecond * 1000
+
+
+def _first_last_valid(v: np.ndarray, starts: np.ndarray, ends: np.ndarray, last: bool) -> np.ndarray:
+    """groupby first/last semantics per segment [starts, ends): skip NaN, NaN if none."""
+    valid = np.flatnonzero(~np.isnan(v))
+    out = np.full(len(starts), np.nan)
+    if last:
+        j = np.searchsorted(valid, ends, side="left") - 1
+        ok = j >= 0
+        ok[ok] = valid[j[ok]] >= starts[ok]
+    else:
+        j = np.searchsorted(valid, starts, side="left")
+        ok = j < len(valid)
+        ok[ok] = valid[j[ok]] < ends[ok]
+    out[ok] = v[valid[j[ok]]]
+    return out
+
+
+def _reduce_segments(cols: dict[str, np.ndarray], starts: np.ndarray, ends: np.ndarray) -> dict[str, np.ndarray]:
+    """OHLCV reduction of contiguous row segments, matching the groupby aggregation."""
+    o, h, l, c, v = (cols[k] for k in _OHLCV)
+    if all(np.issubdtype(a.dtype, np.integer) for a in (o, h, l, c, v)):
+        return {"open": o[starts], "high": np.maximum.reduceat(h, starts), "low": np.minimum.reduceat(l, starts),
+                "close": c[ends - 1], "volume": np.add.reduceat(v, starts)}
+    o, h, l, c, v = (a.astype(float, copy=False) for a in (o, h, l, c, v))
+    vol = np.add.reduceat(np.where(np.isnan(v), 0.0, v), starts) if np.issubdtype(cols["volume"].dtype, np.floating) else np.add.reduceat(cols["volume"], starts)
+    return {
+        "open": _first_last_valid(o, starts, ends, last=False),
+        "high": np.fmax.reduceat(h, starts),
+        "low": np.fmin.reduceat(l, starts),
+        "close": _first_last_valid(c, starts, ends, last=True),
+        "volume": vol,
+    }
+
 @dataclass
 class BarAggregator:
     cfg: AggregationConfig
 
+    def _local_index(self, idx: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        tz = pytz.timezone(self.cfg.tz)
+        # assume UTC if missing tz
+        return idx.tz_localize("UTC").tz_convert(tz) if idx.tz is None else idx.tz_convert(tz)
+
+    def _blocks(self, df_1h: pd.DataFrame):
+        """Session rows of df_1h grouped into blocks, using int64 ns offsets from local midnight.
+
+        Returns (rows, starts, ends, block_end): the kept row positions ordered by
+        block, the [start, end) segment of each block within rows, and the block-end
+        timestamps. None if no row falls inside the session.
+        """
+        idx_local = self._local_index(pd.DatetimeIndex(df_1h.index))
+        wall = idx_local.tz_localize(None).as_unit("ns").asi8
+        tod = wall % _DAY_NS
+        keep = (tod >= _tod_ns(self.cfg.session_open)) & (tod <= _tod_ns(self.cfg.session_close))
+        rows = np.flatnonzero(keep)
+        if len(rows) == 0:
+            return None
+        late = tod[rows] >= _tod_ns(self.cfg.split_time)
+        key = (wall[rows] // _DAY_NS) * 2 + late
+        if len(key) > 1 and np.any(key[1:] < key[:-1]):
+            order = np.argsort(key, kind="stable")
+            rows, key, late = rows[order], key[order], late[order]
+
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+        # block end = local midnight + split/close offset, same arithmetic as the groupby path
+        offset = np.where(late[starts], _tod_ns(self.cfg.session_close), _tod_ns(self.cfg.split_time))
+        midnight = idx_local[rows[starts]].normalize()
+        # keep the resolution the timestamp + Timedelta arithmetic would give
+        unit = (midnight[:1] + pd.Timedelta(_tod_ns(self.cfg.split_time), unit="ns").as_unit("s")).unit
+        block_end = (midnight.as_unit("ns") + pd.to_timedelta(offset, unit="ns")).as_unit(unit)
+        return rows, starts, ends, block_end
+
+    @profiled("aggregation")
     def to_4h_session_aware(self, df_1h: pd.DataFrame) -> pd.DataFrame:
         """Builds synthetic 4H bars as 2 blocks/day for US regular session.
 
@@ -28,7 +110,60 @@ class BarAggregator:
         log_kv(logger, logging.DEBUG, "AGG_START", bars_1h=(0 if df_1h is None else len(df_1h)))
         if df_1h is None or len(df_1h) == 0:
             return df_1h
+        if not all(k in df_1h.columns and pd.api.types.is_numeric_dtype(df_1h[k]) for k in _OHLCV):
+            return self._to_4h_groupby(df_1h)
+
+        plan = self._blocks(df_1h)
+        if plan is None:
+            return df_1h.iloc[0:0].copy()
+        rows, starts, ends, block_end = plan
+        cols = {k: df_1h[k].to_numpy()[rows] for k in _OHLCV}
+        out = pd.DataFrame(_reduce_segments(cols, starts, ends), index=block_end)
+
+        out.index.name = "Timestamp"
+        log_kv(logger, logging.DEBUG, "AGG_DONE", bars_4h=len(out))
+        return out
 
+    @profiled("aggregation")
+    def to_4h_many(self, frames: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+        """to_4h_session_aware for many tickers with one segment reduction over all of them."""
+        plans, parts, out = {}, {k: [] for k in _OHLCV}, {}
+        offset = 0
+        for t, df in frames.items():
+            if df is None or len(df) == 0 or not all(k in df.columns for k in _OHLCV) \
+                    or not all(pd.api.types.is_float_dtype(df[k]) for k in _OHLCV[:4]) \
+                    or not pd.api.types.is_numeric_dtype(df["volume"]):
+                out[t] = self.to_4h_session_aware(df)
+                continue
+            plan = self._blocks(df)
+            if plan is None:
+                out[t] = df.iloc[0:0].copy()
+                continue
+            rows, starts, ends, block_end = plan
+            for k in _OHLCV:
+                parts[k].append(df[k].to_numpy(dtype=float)[rows])
+            plans[t] = (starts + offset, ends + offset, block_end)
+            offset += len(rows)
+
+        if plans:
+            cols = {k: np.concatenate(parts[k]) for k in _OHLCV}
+            starts = np.concatenate([p[0] for p in plans.values()])
+            ends = np.concatenate([p[1] for p in plans.values()])
+            red = _reduce_segments(cols, starts, ends)
+            pos = 0
+            for t, (s, _, block_end) in plans.items():
+                n = len(s)
+                df = pd.DataFrame({k: v[pos:pos + n] for k, v in red.items()}, index=block_end)
+                if pd.api.types.is_integer_dtype(frames[t]["volume"]):
+                    df["volume"] = df["volume"].astype(frames[t]["volume"].dtype)
+                df.index.name = "Timestamp"
+                out[t] = df
+                pos += n
+        log_kv(logger, logging.DEBUG, "AGG_MANY_DONE", tickers=len(frames))
+        return {t: out[t] for t in frames}
+
+    def _to_4h_groupby(self, df_1h: pd.DataFrame) -> pd.DataFrame:
+        """Reference implementation with datetime.time comparisons and groupby (non-numeric input)."""
         tz = pytz.timezone(self.cfg.tz)
 
         idx = df_1h.index
@@ -85,5 +220,4 @@ class BarAggregator:
         )
 
         out.index.name = "Timestamp"
-        log_kv(logger, logging.DEBUG, "AGG_DONE", bars_4h=len(out))
         return out
@@ -12,13 +12,14 @@ from .data import YFDataLoader, aggregate_1d_from_1h
 from .aggregation import BarAggregator
 from .features import FeatureBuilder
 from .catalyst import CatalystEngine
-from .strategy_v15 import StrategyV15
+from .strategy_v15 import StrategyV15, reason_stats
 from .execution import SlippageModel, RiskEngine, compute_drawdown
 from .portfolio import Portfolio
 from .types import Position, SignalType
-from .regime import RegimeEngine
+from .regime import REGIME_NAMES, RegimeEngine, regime_codes
 
-# helper to map intraday ts to daily regime (use date in local tz if tz-aware)
+# helper to map intraday ts to daily regime (use date in local tz if tz-aware);
+# the engines use the vectorized regime.regime_codes instead
 def get_regime(ts: pd.Timestamp, regime_daily: pd.Series) -> str:
     d = ts # .tz_localize(None).normalize()
     if d in regime_daily.index:
@@ -44,13 +45,57 @@ class Backtester:
         self.slip = SlippageModel(slip_cfg)
         self.risk = RiskEngine(risk_cfg)
         self.regime_engine = RegimeEngine(regime_cfg, loader)
+        # optional memo of inputs that only depend on the data and part of the config,
+        # shared by consecutive runs on the same bars (parameter sweeps)
+        self.input_cache: dict | None = None
+        # entry reject reasons of the last run: rejected bars per REASON_BITS tag
+        self.reject_reasons: pd.Series | None = None
+
+    def features_key(self) -> tuple:
+        """input_cache key of the per-ticker feature frames (only the feature parameters matter)."""
+        c = self.feats.cfg
+        return ("features", c.atr_len, c.atr_ma_len, c.range_5d_bars, c.range_20d_bars)
+
+    def _prepare_inputs(self, bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], params: BacktestParams):
+        """Per-ticker inputs shared by all engines: weekly regime, feature frame, catalyst series."""
+        cache = self.input_cache if self.input_cache is not None else {}
 
-    def run(self, bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], params: BacktestParams) -> Portfolio:
-        log_kv(logger, logging.INFO, "BACKTEST_START", tickers=len(bars_4h), start=params.start, end=params.end)
         # regime feed (daily), later mapped to intraday timestamps
-        regime_daily_for_ticker: dict[str, Series] = self.regime_engine.compute_weekly_regime(daily=daily)
+        key = ("regime", self.regime_engine.cfg)
+        if key not in cache:
+            cache[key] = self.regime_engine.compute_weekly_regime(daily=daily)
+        regime_daily_for_ticker: dict[str, Series] = cache[key]
         log_kv(logger, logging.INFO, "DAILY_REGIME_COMPUTED", tickers=len(bars_4h), start=params.start, end=params.end)
 
+        # features once per ticker (causal), the loop below only does row lookups
+        key = self.features_key()
+        if key not in cache:
+            cache[key] = {t: self.feats.build_frame(df) for t, df in bars_4h.items()}
+        features = cache[key]
+        log_kv(logger, logging.INFO, "FEATURES_COMPUTED", tickers=len(features))
+
+        # catalysts per bar in one pass per ticker (earnings dates indexed once,
+        # calendars served from the loader's calendar store)
+        key = ("catalysts", self.strategy.cfg.catalyst_reaction_check, params.start, params.end)
+        if key not in cache:
+            catalysts = {}
+            for t, df in bars_4h.items():
+                cal = self.loader.get_calendar(ticker=t, start=params.start, end=params.end)
+                reaction = daily.get(t) if self.strategy.cfg.catalyst_reaction_check else None
+                self.catalyst.index_calendar(t, cal, daily=reaction)
+                catalysts[t] = self.catalyst.catalyst_series(t, df.index)
+            cache[key] = catalysts
+        catalysts = cache[key]
+        return regime_daily_for_ticker, features, catalysts
+
+    def run(self, bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], params: BacktestParams) -> Portfolio:
+        log_kv(logger, logging.INFO, "BACKTEST_START", tickers=len(bars_4h), start=params.start, end=params.end)
+        regime_daily_for_ticker, features, catalysts = self._prepare_inputs(bars_4h, daily, params)
+        self.reject_reasons = reason_stats(
+            self.strategy.evaluate_frame(df, features[t], catalysts[t]) for t, df in bars_4h.items())
+        # regime per 4H bar, looked up by row in the loop
+        regimes = {t: regime_codes(regime_daily_for_ticker[t], df.index) for t, df in bars_4h.items()}
+
         # build global event timeline
         all_ts = sorted(set().union(*[set(df.index) for df in bars_4h.values()]))
         portfolio = Portfolio(equity=params.initial_equity, equity_high=params.initial_equity)
@@ -60,13 +105,13 @@ class Backtester:
         # main loop
         for ts in all_ts:
             # 1) exits first
-            for t, pos in portfolio.positions.items():
+            for t, pos in list(portfolio.positions.items()):
                 df = bars_4h.get(t)
                 i = next_i.get(t, 0)
                 if df is None or i >= len(df) or df.index[i] != ts:
                     continue
                 close = float(df["close"].iloc[i])
-                feat = self.feats.snapshot(df, i)
+                feat = self.feats.snapshot_at(features[t], i)
 
                 # stop on close below stop_close
                 if close < float(pos.stop_close):
@@ -78,7 +123,7 @@ class Backtester:
                 else:
                     sig = self.strategy.evaluate(
                         df, i, feat,
-                        cat=self.catalyst.get_earnings_catalyst(t, daily.get(t, pd.DataFrame()), current_ts=ts.tz_convert(None), cal=self.loader.get_calendar(ticker=t, start=params.start, end=params.end)),
+                        cat=self.catalyst.info_at(catalysts[t], i),
                         in_position=True
                     )
                     if sig.type == SignalType.EXIT:
@@ -96,9 +141,9 @@ class Backtester:
                 if i >= len(df) or df.index[i] != ts:
                     continue
 
-                feat = self.feats.snapshot(df, i)
+                feat = self.feats.snapshot_at(features[t], i)
 
-                cat = self.catalyst.get_earnings_catalyst(ticker=t, current_ts=ts.tz_convert(None), cal = self.loader.get_calendar(ticker=t, start=params.start, end=params.end))
+                cat = self.catalyst.info_at(catalysts[t], i)
 
                 sig = self.strategy.evaluate(df, i, feat, cat, in_position=False)
                 if sig.type != SignalType.ENTRY:
@@ -107,7 +152,7 @@ class Backtester:
                     next_i[t] = i + 1
                     continue
                 # Long-only rule: no new trades in Defensiv regime
-                regime = get_regime(ts, regime_daily_for_ticker[t])
+                regime = REGIME_NAMES[regimes[t][i]]
                 if regime == "Defensiv":
                     log_kv(logger, logging.DEBUG, "ENTRY_BLOCKED_REGIME", ticker=t, ts=str(ts), regime=regime)
                     next_i[t] = i + 1
@@ -130,6 +175,7 @@ class Backtester:
                 stop = float(feat.last_hl_close) if feat.last_hl_close is not None else entry_close
                 size = self.risk.position_size(portfolio.equity, risk_pct, entry_px, stop)
                 if size <= 0:
+                    next_i[t] = i + 1
                     continue
 
                 portfolio.open_position(Position(
@@ -147,13 +193,13 @@ class Backtester:
                 next_i[t] = i + 1
 
         # close remaining at last available close
-        for t, pos in portfolio.positions.items():
+        for t, pos in list(portfolio.positions.items()):
             df = bars_4h.get(t)
             if df is None:
                 continue
             ts = df.index[-1]
             i = len(df) - 1
-            feat = self.feats.snapshot(df, i)
+            feat = self.feats.snapshot_at(features[t], i)
             close = float(df["close"].iloc[i])
             exit_px = self.slip.apply(close, feat.atr, side="sell")
             portfolio.close_position(t, ts, exit_px, reason="EOD_FORCE")
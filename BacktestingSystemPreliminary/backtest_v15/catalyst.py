@@ -1,12 +1,15 @@
 from __future__ import annotations
 import logging
-from dataclasses import dataclass
+from bisect import bisect_left
+from dataclasses import dataclass, field
 from typing import Optional, Tuple, List
+import numpy as np
 import pandas as pd
 from .data import YFDataLoader
 from .indicators import atr, pct_change
 from .structure import detect_swings_close_only
 from .logging import log_kv
+from .profiling import profiled
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -15,26 +18,141 @@ class CatalystInfo:
     catalyst_class: str  # K1 or K2 or NONE
     catalyst_date: Optional[pd.Timestamp]
 
+_NO_CATALYST = CatalystInfo(False, "NONE", None)
+
+@dataclass
+class _EarningsIndex:
+    dates: np.ndarray      # datetime64[ns], sorted, naive
+    confirmed: np.ndarray  # datetime64[ns], first time the reaction is known
+    classes: np.ndarray    # object: K1 / K2 / NONE
+    infos: List[CatalystInfo]
+
+def _naive_ns(ts) -> np.ndarray:
+    idx = pd.DatetimeIndex(ts)
+    if idx.tz is not None:
+        idx = idx.tz_convert(None)
+    return idx.as_unit("ns").asi8.view("datetime64[ns]")
+
+def classify_daily_reaction(daily: pd.DataFrame, atr_len: int = 14, vol_len: int = 20) -> pd.Series:
+    """Number of v1.5 reaction criteria (0-3) met by each daily bar, close-only.
+
+    - range >= 1.5 x ATR(14) and close in the upper third
+    - close above the last confirmed swing-high close
+    - volume >= 1.5 x prior 20d average or close >= +1.2 %
+    """
+    d = daily
+    rng = d["high"] - d["low"]
+    upper_third = (d["close"] - d["low"]) >= (2.0 / 3.0) * rng
+    c1 = (rng >= 1.5 * atr(d, atr_len)) & upper_third
+
+    swings = detect_swings_close_only(d["close"], 2, 2)
+    last_high = d["close"].where(swings.swing_high).shift(2).ffill().shift(1)
+    c2 = d["close"] > last_high
+
+    vol_avg = d["volume"].rolling(vol_len).mean().shift(1)
+    c3 = (d["volume"] >= 1.5 * vol_avg) | (pct_change(d["close"]) >= 0.012)
+
+    return c1.astype(int) + c2.astype(int) + c3.astype(int)
+
 @dataclass
 class CatalystEngine:
     loader: YFDataLoader
+    max_age: pd.Timedelta = pd.Timedelta(days=14)
+    _events: dict[str, _EarningsIndex] = field(default_factory=dict, init=False, repr=False)
+
+    @profiled("catalyst")
+    def index_calendar(self, ticker: str, cal: List[pd.Timestamp], daily: pd.DataFrame | None = None) -> None:
+        """Pre-index a ticker's earnings dates into sorted arrays.
+
+        Without daily bars every earnings date counts as K1 from the date itself
+        (the legacy proxy). With daily bars the reaction on the earnings session
+        or the one after is classified (K1: >= 2 criteria, K2: 1, NONE: 0) and the
+        catalyst only becomes visible once that session has closed.
+        """
+        dates = np.unique(_naive_ns(pd.DatetimeIndex(cal if cal is not None else [])).astype("datetime64[D]")).astype("datetime64[ns]")
+        classes = np.full(len(dates), "K1", dtype=object)
+        confirmed = dates.copy()
+
+        if daily is not None and len(daily) > 0 and len(dates) > 0:
+            score = classify_daily_reaction(daily).to_numpy()
+            label = _naive_ns(daily.index)
+            # daily bars are labelled at the end of their session (see aggregate_1d_from_1h)
+            local = pd.DatetimeIndex(daily.index)
+            if local.tz is not None:
+                local = local.tz_localize(None)
+            session_day = (local - pd.Timedelta(days=1)).normalize().to_numpy().astype("datetime64[D]")
+            first = np.searchsorted(session_day, dates.astype("datetime64[D]"), side="left")
+            for k, j in enumerate(first):
+                window = [p for p in (j, j + 1) if p < len(score)]
+                if not window:
+                    classes[k] = "NONE"
+                    continue
+                best = max(window, key=lambda p: score[p])
+                n = int(score[best])
+                classes[k] = "K1" if n >= 2 else ("K2" if n == 1 else "NONE")
+                confirmed[k] = label[best]
+
+        infos = [CatalystInfo(c != "NONE", str(c), pd.Timestamp(d)) for d, c in zip(dates, classes)]
+        self._events[ticker] = _EarningsIndex(dates=dates, confirmed=confirmed, classes=classes, infos=infos)
+        log_kv(logger, logging.DEBUG, "CATALYST_INDEXED", ticker=ticker, events=len(dates), classified=daily is not None)
+
+    @profiled("catalyst")
+    def catalyst_series(self, ticker: str, bar_index: pd.DatetimeIndex) -> pd.DataFrame:
+        """has_catalyst / catalyst_class / catalyst_date for every bar in one pass.
+
+        A bar sees the earliest earnings date d with d <= ts <= d + max_age,
+        provided the reaction is confirmed by ts. Call index_calendar() first.
+        """
+        ev = self._events.get(ticker)
+        ts = _naive_ns(bar_index)
+        n = len(ts)
+        has = np.zeros(n, dtype=bool)
+        cls = np.full(n, "NONE", dtype=object)
+        cdate = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+
+        if ev is not None and len(ev.dates) > 0:
+            j = np.searchsorted(ev.dates, ts - np.timedelta64(self.max_age.value, "ns"), side="left")
+            jj = np.minimum(j, len(ev.dates) - 1)
+            hit = (j < len(ev.dates)) & (ev.dates[jj] <= ts) & (ev.confirmed[jj] <= ts) & (ev.classes[jj] != "NONE")
+            has = hit
+            cls[hit] = ev.classes[jj[hit]]
+            cdate[hit] = ev.dates[jj[hit]]
+
+        return pd.DataFrame({"has_catalyst": has, "catalyst_class": cls, "catalyst_date": cdate}, index=bar_index)
+
+    @staticmethod
+    def info_at(series: pd.DataFrame, idx: int) -> CatalystInfo:
+        """CatalystInfo for one row of a frame produced by catalyst_series()."""
+        if series is None or idx < 0 or idx >= len(series):
+            return _NO_CATALYST
+        row = series.iloc[int(idx)]
+        if not row["has_catalyst"]:
+            return _NO_CATALYST
+        return CatalystInfo(True, str(row["catalyst_class"]), pd.Timestamp(row["catalyst_date"]))
 
     def get_earnings_catalyst(self, ticker: str, current_ts: pd.Timestamp, cal: List[pd.Timestamp]) -> CatalystInfo:
         log_kv(logger, logging.DEBUG, "CATALYST_CHECK", ticker=ticker, asof=str(current_ts.date()) if hasattr(current_ts, 'date') else str(current_ts))
         """Uses yfinance calendar as a catalyst proxy (earnings date).
 
-        Classification K1/K2 uses a simplified daily reaction check.
+        Indexed tickers (index_calendar) are looked up by bisect; otherwise cal
+        must be sorted ascending, as returned by YFDataLoader.get_calendar.
 
         """
+        ev = self._events.get(ticker)
+        if ev is not None:
+            if len(ev.dates) == 0:
+                return _NO_CATALYST
+            now = _naive_ns([current_ts])[0]
+            j = int(np.searchsorted(ev.dates, now - np.timedelta64(self.max_age.value, "ns"), side="left"))
+            if j < len(ev.dates) and ev.dates[j] <= now and ev.confirmed[j] <= now:
+                return ev.infos[j] if ev.infos[j].has_catalyst else _NO_CATALYST
+            return _NO_CATALYST
+
         if cal is None or len(cal) == 0:
             log_kv(logger, logging.DEBUG, "CATALYST_NONE", ticker=ticker, reason="NO_CALENDAR")
-            return CatalystInfo(False, "NONE", None)
-
-        for earnings_date in cal:
-            if earnings_date > current_ts:
-                break
-            if earnings_date <= current_ts <= earnings_date + pd.Timedelta(days=14):
-                return CatalystInfo(True, "K1", earnings_date)
-        return CatalystInfo(False, "NONE", None)
-
+            return _NO_CATALYST
 
+        j = bisect_left(cal, current_ts - self.max_age)
+        if j < len(cal) and cal[j] <= current_ts:
+            return CatalystInfo(True, "K1", cal[j])
+        return _NO_CATALYST
@@ -1,31 +1,69 @@
 from __future__ import annotations
-import argparse, os, time
+import argparse, dataclasses, itertools, json, os, time
 import logging
 import random
 from datetime import date, timedelta
 
-from .config import UniverseConfig, DataConfig, AggregationConfig, SlippageConfig, RiskConfig, StrategyConfig, RegimeConfig
-from .data import YFDataLoader, aggregate_1d_from_1h
+from .config import UniverseConfig, DataConfig, DBConfig, AggregationConfig, SlippageConfig, RiskConfig, StrategyConfig, RegimeConfig
+from .data import YFDataLoader
+from .db import DBDataLoader
+from .service import ServiceFetcher
+from .derived import DerivedBarCache
 from .universe import UniverseBuilder
 from .backtest import Backtester, BacktestParams
+from .columnar import ColumnarBacktester
+from .parallel import ParallelBacktester
+from .pipeline import PrepPipeline
 from .reporting import save_run
+from .sweep import SweepBase, expand_grid, run_sweep
 from .logging import setup_logging, log_kv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from .profiling import start_profiling, stop_profiling, timed
 from .aggregation import BarAggregator
 
-def _prepare_ticker(loader, aggregator, ticker, start, end, logger):
-    try:
-        d1h = loader.get_ohlcv(ticker, start=start, end=end, interval="1h")
-        if d1h is None or len(d1h) == 0:
-            return ticker, None, None, None
-        b4 = aggregator.to_4h_session_aware(d1h)
-        if b4 is None or len(b4) < 200:
-            return ticker, None, None, None
-        d1 = aggregate_1d_from_1h(d1h)
-        return ticker, d1h, b4, d1
-    except Exception as e:
-        log_kv(logger, logging.WARN, "PREP_FAIL", ticker=ticker, exception=e)
-        return ticker, None, None, None
+def _make_loader(args, dcfg: DataConfig):
+    """yfinance loader, the same loader reading from --data-service, or DBDataLoader when --db is given
+    (prefetch chunks then match its bulk query size)."""
+    if args.data_service:
+        # the service is ours: no rate limit, larger batches per request
+        dcfg = dataclasses.replace(dcfg, download_rate_per_s=0, download_batch_size=500)
+        return YFDataLoader(dcfg, fetcher=ServiceFetcher(args.data_service))
+    if not args.db:
+        return YFDataLoader(dcfg)
+    db = DBConfig(dsn=args.db, backend=args.db_backend, pool_size=args.max_workers)
+    return DBDataLoader(dataclasses.replace(dcfg, download_batch_size=db.query_batch_size), db)
+
+def _data_source(args) -> str:
+    if args.data_service:
+        return f"service:{args.data_service}"
+    return args.db_backend if args.db else "yfinance"
+
+def _prefetched(loader, tickers, start, end, interval):
+    """Yield tickers, fetching each chunk's missing bars with one batched download first."""
+    it = iter(tickers)
+    while True:
+        chunk = list(itertools.islice(it, loader.cfg.download_batch_size))
+        if not chunk:
+            return
+        loader.prefetch_ohlcv(chunk, start, end, interval)
+        yield from chunk
+
+
+def _load_universe(args, loader, ub, aggregator, start, end, logger, feats=None):
+    """Sample tickers from the tickers file and prepare 4H / daily bars (and features) for the accepted ones."""
+    # build universe
+    all_tickers = ub.read_tickers_file(args.tickers_file)
+    all_tickers = list(dict.fromkeys([t.strip() for t in all_tickers if t.strip()]))
+    tickers = random.sample(all_tickers, k=args.sample)
+
+    tickers_pool = list(dict.fromkeys(all_tickers))
+    random.shuffle(tickers_pool)
+
+    # Candidate stream: shuffled pool of unique tickers, downloaded in batches ahead of the workers
+    candidates = _prefetched(loader, tickers_pool, start, end, "1h")
+
+    derived = DerivedBarCache(os.path.join(loader.cfg.cache_dir, "derived"), aggregator) if loader.cfg.cache_dir else None
+    pipeline = PrepPipeline(loader, aggregator, ub, start, end, feats=feats, derived=derived, fetch_workers=loader.cfg.max_workers)
+    return pipeline.run(candidates, want=args.sample)
 
 
 def cmd_run(args):
@@ -36,7 +74,8 @@ def cmd_run(args):
     log_dir = os.path.join(run_dir, "logs")
     os.makedirs(log_dir, exist_ok=True)
 
-    setup_logging(log_dir=log_dir, overwrite=True, max_bytes = 250_000_000, backup_count=2)
+    setup_logging(log_dir=log_dir, overwrite=True, max_bytes = 250_000_000, backup_count=2,
+                  file_level=logging.getLevelName(args.log_level), event_sink=args.event_log)
     logger = logging.getLogger(__name__)
 
     # timeframe is dynamically set so it can get the oldest hourly data available with yfinance (730 days ago)
@@ -44,76 +83,43 @@ def cmd_run(args):
     end=date.today()
 
     log_kv(logger, logging.INFO, "RUN_START", start=start, end=end, sample=args.sample, tickers_file=args.tickers_file)
+    if args.profile or args.profile_pstats:
+        start_profiling()
+    cprof = None
+    if args.profile_pstats:
+        import cProfile
+        cprof = cProfile.Profile()
+        cprof.enable()
     # Setup
 
     ucfg = UniverseConfig(min_price=args.min_price,min_avg_dollar_vol_20d=args.min_dvol,min_1h_days=args.min_1h_days)
-    dcfg = DataConfig(cache_dir=args.cache_dir, auto_adjust=True, max_workers=6)
+    dcfg = DataConfig(cache_dir=args.cache_dir, auto_adjust=True, max_workers=args.max_workers)
     acfg = AggregationConfig()
     scfg = StrategyConfig()
     slip = SlippageConfig(seed=args.slip_seed, max_atr_frac=args.slip_atr_frac)
     rcfg = RiskConfig()
-    regcfg = RegimeConfig(ref_ticker=args.regime_ref)
+    regcfg = RegimeConfig(ref_ticker=args.regime_ref, mode=args.regime_mode)
 
-    loader = YFDataLoader(dcfg)
+    loader = _make_loader(args, dcfg)
     ub = UniverseBuilder(ucfg, loader)
     aggregator = BarAggregator(acfg)
 
-    # build universe
-    all_tickers = ub.read_tickers_file(args.tickers_file)
-    all_tickers = list(dict.fromkeys([t.strip() for t in all_tickers if t.strip()]))
-    tickers = random.sample(all_tickers, k=args.sample)
-
-    tickers_pool = list(dict.fromkeys(all_tickers))
-    random.shuffle(tickers_pool)
-
-    accepted = set()
-    bars_4h, daily = {}, {}
-    tested = 0
-    max_workers = 24
-
-    # Candidate stream: shuffled pool of unique tickers
-    candidates = iter(tickers_pool)
-
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        in_flight = {}
-
-        # Prime the pool
-        while len(in_flight) < max_workers and len(accepted) < args.sample:
-            t = next(candidates, None)
-            if t is None:
-                break
-            in_flight[ex.submit(_prepare_ticker, loader, aggregator, t, start, end, logger)] = t
-
-        # Consume results; for each completed task, optionally enqueue one more.
-        while in_flight and len(accepted) < args.sample:
-            for fut in as_completed(in_flight):
-                t = in_flight.pop(fut)
-                tested += 1
-
-                ticker, d1h, b4, d1 = fut.result()
-                if b4 is not None and d1 is not None:
-                    if ub._passes_hygiene(ticker=ticker, oneh=d1h, daily=d1):
-                        accepted.add(t)
-                        bars_4h[t] = b4
-                        daily[t] = d1
-
-                # Keep the pool filled until we have enough accepted tickers.
-                if len(accepted) < args.sample:
-                    nxt = next(candidates, None)
-                    if nxt is not None:
-                        in_flight[ex.submit(_prepare_ticker, loader, aggregator, nxt, start, end, logger)] = nxt
-
-                # Break so the outer while can re-check stop conditions.
-                break
-
-        # Optional: if we reached the sample early, try to cancel not-yet-started futures.
-        for fut in list(in_flight):
-            fut.cancel()
+    if args.engine == "parallel":
+        bt = ParallelBacktester(loader, acfg, scfg, slip, rcfg, regcfg, max_workers=args.max_workers)
+    else:
+        engine_cls = ColumnarBacktester if args.engine == "columnar" else Backtester
+        bt = engine_cls(loader, acfg, scfg, slip, rcfg, regcfg)
 
+    # the parallel engine builds features in its own workers; the others take them from the prep pipeline
+    with timed("prep"):
+        prep = _load_universe(args, loader, ub, aggregator, start, end, logger, feats=None if args.engine == "parallel" else bt.feats)
+    bars_4h, daily = prep.bars_4h, prep.daily
+    if prep.features:
+        bt.input_cache = {bt.features_key(): prep.features}
 
     # run backtest
-    bt = Backtester(loader, acfg, scfg, slip, rcfg, regcfg)
-    pf = bt.run(bars_4h=bars_4h, daily=daily, params=BacktestParams(start=start, end=end, initial_equity=args.initial_equity))
+    with timed("backtest"):
+        pf = bt.run(bars_4h=bars_4h, daily=daily, params=BacktestParams(start=start, end=end, initial_equity=args.initial_equity))
 
     params = {
         "start": start,
@@ -127,23 +133,98 @@ def cmd_run(args):
         "min_1h_days": args.min_1h_days,
         "slippage": {"seed": args.slip_seed, "max_atr_frac": args.slip_atr_frac},
         "regime_ref": args.regime_ref,
+        "regime_mode": args.regime_mode,
+        "data_source": _data_source(args),
+        "engine": args.engine,
     }
-    save_run(run_dir, pf, params)
+    save_run(run_dir, pf, params, reject_reasons=bt.reject_reasons)
+    if cprof is not None:
+        cprof.disable()
+        cprof.dump_stats(os.path.join(run_dir, "profile.pstats"))
+    prof = stop_profiling()
+    if prof is not None:
+        prof.write(os.path.join(run_dir, "profile.json"))
     print(f"Run saved to: {run_dir}")
     print(f"Trades: {len(pf.trades)}  Final equity: {pf.equity:.2f}")
 
-def build_parser():
-    p = argparse.ArgumentParser(prog="backtest_v15")
-    sub = p.add_subparsers(dest="cmd", required=True)
+def cmd_sweep(args):
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(args.out_dir, f"sweep-{run_id}")
+    log_dir = os.path.join(run_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
 
-    r = sub.add_parser("run")
+    setup_logging(log_dir=log_dir, overwrite=True, max_bytes = 250_000_000, backup_count=2,
+                  file_level=logging.getLevelName(args.log_level), event_sink=args.event_log)
+    logger = logging.getLogger(__name__)
+
+    start=date.today()-timedelta(days=365)
+    end=date.today()
+
+    combos = expand_grid(args.param)
+    log_kv(logger, logging.INFO, "SWEEP_RUN_START", start=start, end=end, sample=args.sample, combos=len(combos))
+
+    ucfg = UniverseConfig(min_price=args.min_price,min_avg_dollar_vol_20d=args.min_dvol,min_1h_days=args.min_1h_days)
+    dcfg = DataConfig(cache_dir=args.cache_dir, auto_adjust=True, max_workers=args.max_workers)
+    acfg = AggregationConfig()
+    base = SweepBase(
+        aggregation=acfg,
+        strategy=StrategyConfig(),
+        risk=RiskConfig(),
+        slippage=SlippageConfig(seed=args.slip_seed, max_atr_frac=args.slip_atr_frac),
+        regime=RegimeConfig(ref_ticker=args.regime_ref, mode=args.regime_mode),
+        engine=args.engine,
+    )
+
+    loader = _make_loader(args, dcfg)
+    ub = UniverseBuilder(ucfg, loader)
+    aggregator = BarAggregator(acfg)
+
+    # data prep happens once; every combination reuses the same bars
+    prep = _load_universe(args, loader, ub, aggregator, start, end, logger)
+    bars_4h, daily = prep.bars_4h, prep.daily
+
+    params = BacktestParams(start=start, end=end, initial_equity=args.initial_equity)
+    summary = run_sweep(bars_4h, daily, combos, base, params, loader, max_workers=args.max_workers)
+    summary.to_csv(os.path.join(run_dir, "sweep.csv"), index=False)
+
+    with open(os.path.join(run_dir, "params.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "start": start,
+            "end": end,
+            "initial_equity": args.initial_equity,
+            "tickers_file": args.tickers_file,
+            "sample": args.sample,
+            "tickers": sorted(bars_4h),
+            "grid": args.param,
+            "engine": args.engine,
+            "slippage": {"seed": args.slip_seed, "max_atr_frac": args.slip_atr_frac},
+            "regime_ref": args.regime_ref,
+            "regime_mode": args.regime_mode,
+            "data_source": _data_source(args),
+        }, f, indent=2, default=str)
+    print(f"Sweep saved to: {run_dir}")
+    print(f"Combinations: {len(summary)}")
+
+def _add_universe_args(r):
     r.add_argument("--tickers-file", required=True, help="One ticker per line.")
     r.add_argument("--sample", type=int, default=100)
     r.add_argument("--sample-seed", type=int, default=42)
     r.add_argument("--initial-equity", type=float, default=10000.0)
     r.add_argument("--cache-dir", default="cache")
     r.add_argument("--out-dir", default="runs")
-    r.add_argument("--max-workers", type=int, default=6, help="Parallel downloads/prepare workers (ThreadPoolExecutor).")
+    r.add_argument("--max-workers", type=int, default=6, help="Parallel download/prepare workers and backtest processes.")
+
+    # data source
+    r.add_argument("--db", default=None, metavar="DSN",
+                   help="Read bars and earnings dates from a database instead of yfinance: Postgres conninfo or DuckDB file.")
+    r.add_argument("--db-backend", choices=["postgres", "duckdb"], default="postgres")
+    r.add_argument("--data-service", default=None, metavar="URL",
+                   help="Read bars from the MarketDataLoader service (e.g. http://localhost:8000) instead of yfinance.")
+
+    # logging
+    r.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING"], default="DEBUG", help="Level of the log files.")
+    r.add_argument("--event-log", action="store_true",
+                   help="Write DEBUG events as JSON lines to logs/events.jsonl from a background thread instead of the text logs.")
 
     # hygiene
     #
@@ -161,8 +242,30 @@ def build_parser():
 
     # regime
     r.add_argument("--regime-ref", default="SPY")
+    r.add_argument("--regime-mode", choices=["ticker", "reference"], default="ticker",
+                   help="ticker: regime from each ticker's own daily bars; reference: market regime of --regime-ref for all tickers.")
 
+def build_parser():
+    p = argparse.ArgumentParser(prog="backtest_v15")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run")
+    _add_universe_args(r)
+    # engine: "loop" is the reference implementation, "columnar" the array kernel and
+    # "parallel" the columnar kernel with per-ticker signals in a process pool (same trades)
+    r.add_argument("--engine", choices=["loop", "columnar", "parallel"], default="loop")
+    r.add_argument("--profile", action="store_true",
+                   help="Write per-stage timings and per-function call counts to profile.json in the run directory.")
+    r.add_argument("--profile-pstats", action="store_true",
+                   help="Also run cProfile and dump profile.pstats next to trades.csv (implies --profile).")
     r.set_defaults(func=cmd_run)
+
+    sw = sub.add_parser("sweep", help="Backtest a grid of StrategyConfig/RiskConfig/SlippageConfig values on one data prep.")
+    _add_universe_args(sw)
+    sw.add_argument("--param", action="append", required=True, metavar="NAME=V1,V2",
+                    help="Config field and values to sweep, e.g. pullback_max_retrace=0.4,0.5. Repeat for a grid.")
+    sw.add_argument("--engine", choices=["loop", "columnar"], default="columnar")
+    sw.set_defaults(func=cmd_sweep)
     return p
 
 def main():
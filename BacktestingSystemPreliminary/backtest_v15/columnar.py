@@ -0,0 +1,209 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .backtest import Backtester, BacktestParams
+from .execution import compute_drawdown
+from .logging import log_kv
+from .profiling import profiled
+from .portfolio import Portfolio
+from .regime import REGIME_NAMES, regime_codes
+from .strategy_v15 import StrategyV15, reason_stats
+from .types import Position
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ColumnarGrid:
+    """All tickers aligned on one shared timestamp grid (time x ticker).
+
+    pos[r, c] is the row of tickers[c]'s own frame at grid row r, or -1 when the
+    ticker has no bar there. Value arrays are NaN/False where pos is -1.
+    """
+    index: pd.DatetimeIndex
+    tickers: list[str]
+    pos: np.ndarray          # int64
+    close: np.ndarray        # float64
+    atr: np.ndarray          # float64
+    last_hl: np.ndarray      # float64
+    entry: np.ndarray        # bool, strategy ENTRY signal
+    exit: np.ndarray         # bool, strategy EXIT signal (trend break)
+    catalyst_class: np.ndarray  # object
+
+
+@profiled("strategy")
+def ticker_columns(bars_4h: pd.DataFrame, features: pd.DataFrame, catalysts: pd.DataFrame, strategy: StrategyV15) -> pd.DataFrame:
+    """The per-bar columns of one ticker that the replay needs."""
+    signals = strategy.evaluate_frame(bars_4h, features, catalysts)
+    return pd.DataFrame({
+        "close": bars_4h["close"].to_numpy(dtype=float),
+        "atr": features["atr"].to_numpy(dtype=float),
+        "last_hl": features["last_hl_close"].to_numpy(dtype=float),
+        "entry": signals["entry"].to_numpy(),
+        "exit": signals["exit"].to_numpy(),
+        "catalyst_class": catalysts["catalyst_class"].to_numpy(),
+        "reasons": signals["reasons"].to_numpy(),
+    }, index=bars_4h.index)
+
+
+def assemble_grid(columns: dict[str, pd.DataFrame]) -> ColumnarGrid:
+    """Align per-ticker columns (in dict order) on the union of their timestamps."""
+    tickers = list(columns)
+    index = pd.DatetimeIndex(sorted(set().union(*[set(df.index) for df in columns.values()])))
+    shape = (len(index), len(tickers))
+
+    pos = np.full(shape, -1, dtype=np.int64)
+    close = np.full(shape, np.nan)
+    atr_v = np.full(shape, np.nan)
+    last_hl = np.full(shape, np.nan)
+    entry = np.zeros(shape, dtype=bool)
+    exit_ = np.zeros(shape, dtype=bool)
+    cat_cls = np.full(shape, "NONE", dtype=object)
+
+    for c, t in enumerate(tickers):
+        cols = columns[t]
+        if len(cols) == 0:
+            continue
+        rows = index.get_indexer(cols.index)
+        pos[rows, c] = np.arange(len(cols))
+        close[rows, c] = cols["close"].to_numpy()
+        atr_v[rows, c] = cols["atr"].to_numpy()
+        last_hl[rows, c] = cols["last_hl"].to_numpy()
+        entry[rows, c] = cols["entry"].to_numpy()
+        exit_[rows, c] = cols["exit"].to_numpy()
+        cat_cls[rows, c] = cols["catalyst_class"].to_numpy()
+
+    return ColumnarGrid(index, tickers, pos, close, atr_v, last_hl, entry, exit_, cat_cls)
+
+
+def build_columns(bars_4h: dict[str, pd.DataFrame], features: dict[str, pd.DataFrame], catalysts: dict[str, pd.DataFrame], strategy: StrategyV15) -> dict[str, pd.DataFrame]:
+    return {t: ticker_columns(df, features[t], catalysts[t], strategy) for t, df in bars_4h.items()}
+
+
+@profiled("regime")
+def regime_grid(grid: ColumnarGrid, regime_daily_for_ticker: dict[str, pd.Series]) -> np.ndarray:
+    """int8 regime code per grid cell; a Series shared by several tickers is mapped once."""
+    out = np.zeros(grid.pos.shape, dtype=np.int8)
+    memo: dict[int, np.ndarray] = {}
+    for c, t in enumerate(grid.tickers):
+        series = regime_daily_for_ticker[t]
+        codes = memo.get(id(series))
+        if codes is None:
+            codes = memo[id(series)] = regime_codes(series, grid.index)
+        rows = np.flatnonzero(grid.pos[:, c] >= 0)
+        out[rows, c] = codes[rows]
+    return out
+
+
+def _opt(v: float) -> float | None:
+    return None if np.isnan(v) else float(v)
+
+
+class ColumnarBacktester(Backtester):
+    """Array-based engine producing the same trades as Backtester.run.
+
+    Signals are evaluated for the whole (time x ticker) grid up front; the loop
+    over grid rows only touches open positions and bars with an ENTRY signal.
+    Call order into SlippageModel / RiskEngine / Portfolio matches the reference
+    loop exactly, so the seeded slippage stream and the trades are identical.
+    """
+
+    def run(self, bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], params: BacktestParams) -> Portfolio:
+        log_kv(logger, logging.INFO, "BACKTEST_START", tickers=len(bars_4h), start=params.start, end=params.end, engine="columnar")
+        regime_daily_for_ticker, features, catalysts = self._prepare_inputs(bars_4h, daily, params)
+        columns = build_columns(bars_4h, features, catalysts, self.strategy)
+        self.reject_reasons = reason_stats(columns.values())
+        grid = assemble_grid(columns)
+        log_kv(logger, logging.INFO, "GRID_BUILT", rows=len(grid.index), tickers=len(grid.tickers), entries=int(grid.entry.sum()))
+        return self._replay(grid, regime_daily_for_ticker, params)
+
+    def _replay(self, grid: ColumnarGrid, regime_daily_for_ticker: dict[str, pd.Series], params: BacktestParams) -> Portfolio:
+        portfolio = Portfolio(equity=params.initial_equity, equity_high=params.initial_equity)
+        col = {t: c for c, t in enumerate(grid.tickers)}
+        regimes = regime_grid(grid, regime_daily_for_ticker)
+        entry_rows = np.flatnonzero(grid.entry.any(axis=1))
+        entry_set = set(entry_rows.tolist())
+
+        for r, ts in enumerate(grid.index):
+            if not portfolio.positions and r not in entry_set:
+                continue
+
+            # 1) exits first, in position insertion order
+            advanced = set()
+            for t, pos in list(portfolio.positions.items()):
+                c = col[t]
+                if grid.pos[r, c] < 0:
+                    continue
+                close = float(grid.close[r, c])
+                atr_v = _opt(grid.atr[r, c])
+                if close < float(pos.stop_close):
+                    exit_px = self.slip.apply(close, atr_v, side="sell")
+                    portfolio.close_position(t, ts, exit_px, reason="STOP_CLOSE")
+                    log_kv(logger, logging.INFO, "STOP_CLOSE", ticker=t)
+                    continue
+                if grid.exit[r, c]:
+                    exit_px = self.slip.apply(close, atr_v, side="sell")
+                    portfolio.close_position(t, ts, exit_px, reason="TREND_BREAK")
+                    log_kv(logger, logging.INFO, "TREND_BREAK", ticker=t)
+                advanced.add(c)
+
+            if r not in entry_set:
+                continue
+
+            # 2) entries, in ticker order
+            for c in np.flatnonzero(grid.entry[r]):
+                t = grid.tickers[c]
+                if t in portfolio.positions or c in advanced:
+                    continue
+
+                regime = REGIME_NAMES[regimes[r, c]]
+                if regime == "Defensiv":
+                    log_kv(logger, logging.DEBUG, "ENTRY_BLOCKED_REGIME", ticker=t, ts=str(ts), regime=regime)
+                    continue
+
+                catalyst_class = str(grid.catalyst_class[r, c])
+                portfolio.mark_equity()
+                ddn = compute_drawdown(portfolio.equity, portfolio.equity_high)
+                risk_pct = self.risk.risk_pct(
+                    equity=portfolio.equity,
+                    equity_high=portfolio.equity_high,
+                    dd=ddn,
+                    regime=regime,
+                    catalyst_class=catalyst_class,
+                )
+
+                entry_close = float(grid.close[r, c])
+                entry_px = self.slip.apply(entry_close, _opt(grid.atr[r, c]), side="buy")
+
+                last_hl = _opt(grid.last_hl[r, c])
+                stop = last_hl if last_hl is not None else entry_close
+                size = self.risk.position_size(portfolio.equity, risk_pct, entry_px, stop)
+                if size <= 0:
+                    continue
+
+                portfolio.open_position(Position(
+                    ticker=t,
+                    entry_ts=ts,
+                    entry_price=entry_px,
+                    size=size,
+                    stop_close=stop,
+                    risk_pct=risk_pct,
+                    catalyst_class=catalyst_class,
+                    regime=regime,
+                ))
+                log_kv(logger, logging.INFO, "OPEN_POSITION", ticker=t)
+
+        # close remaining at last available close
+        for t, pos in list(portfolio.positions.items()):
+            c = col[t]
+            r = int(np.flatnonzero(grid.pos[:, c] >= 0)[-1])
+            close = float(grid.close[r, c])
+            exit_px = self.slip.apply(close, _opt(grid.atr[r, c]), side="sell")
+            portfolio.close_position(t, grid.index[r], exit_px, reason="EOD_FORCE")
+            log_kv(logger, logging.INFO, "EOD_FORCE", ticker=t)
+
+        log_kv(logger, logging.INFO, "BACKTEST_DONE", trades=len(portfolio.trades), equity=portfolio.equity)
+        return portfolio
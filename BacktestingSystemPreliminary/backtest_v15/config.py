@@ -13,6 +13,20 @@ class DataConfig:
     cache_dir: str = "cache"
     auto_adjust: bool = True
     max_workers: int = 6
+    calendar_ttl_hours: float = 24.0  # earnings dates on disk are refetched after this
+    download_batch_size: int = 50  # tickers per multi-symbol download request
+    download_rate_per_s: float = 2.0  # token bucket: tickers per second ...
+    download_burst: int = 50  # ... and how many may be saved up
+    download_max_retries: int = 4
+    download_backoff_s: float = 5.0  # first pause after throttling, doubled per retry
+
+@dataclass(frozen=True)
+class DBConfig:
+    dsn: str = ""  # Postgres conninfo (e.g. "dbname=backtest_data user=postgres") or DuckDB file path
+    backend: str = "postgres"  # "postgres" (TimescaleDB, see db_schma.py) or "duckdb" (local stand-in, same tables)
+    pool_size: int = 8  # connections shared by the prep threads
+    query_batch_size: int = 500  # tickers per bulk query
+    tz: str = "America/New_York"  # bars are returned in this timezone, like yfinance
 
 @dataclass(frozen=True)
 class AggregationConfig:
@@ -43,10 +57,12 @@ class StrategyConfig:
     range_20d_bars: int = 40    # 20 trading days * 2 blocks/day
     catalyst_max_age_days: int = 10  # trading days
     require_catalyst: bool = True
+    catalyst_reaction_check: bool = False  # classify K1/K2 from the daily reaction instead of K1 for every earnings date
 
 @dataclass(frozen=True)
 class RegimeConfig:
     ref_ticker: str = "SPY"  # per v1.5 doc
+    mode: str = "ticker"  # "ticker": own daily bars per ticker, "reference": ref_ticker's regime for all
     sma_fast: int = 50
     sma_slow: int = 200
     atr_len: int = 14
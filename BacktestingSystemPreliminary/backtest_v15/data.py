@@ -3,17 +3,21 @@ from __future__ import annotations
 import os
 import hashlib
 import logging
-import re
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from threading import Lock
-from typing import Optional, List
+from typing import Optional, List, Protocol
 from datetime import date
 import pandas as pd
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
 
 
 from .config import DataConfig
+from .download import DownloadScheduler, MaybeRateLimited, RateLimited, TokenBucket
 from .logging import log_kv
+from .profiling import profiled
+from .store import OhlcvStore, safe_name, window_frame
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +49,7 @@ def _load_any_cached_ohlcv(cache_dir: str) -> Optional[pd.DataFrame]:
     return None
 
 
+@profiled("aggregation")
 def aggregate_1d_from_1h(df_1h: pd.DataFrame) -> Optional[pd.DataFrame]:
     """
     Aggregate 1H OHLCV bars into synthetic Daily bars (close-only semantics).
@@ -71,52 +76,128 @@ def aggregate_1d_from_1h(df_1h: pd.DataFrame) -> Optional[pd.DataFrame]:
     return daily
 
 
+def _normalize_ohlcv(df: pd.DataFrame, ticker: str | None = None) -> pd.DataFrame:
+    if isinstance(df.columns, pd.MultiIndex):
+        # robust: versuche in letzter Ebene den ticker zu finden
+        if ticker in df.columns.get_level_values(-1):
+            df = df.xs(ticker, axis=1, level=-1, drop_level=True)
+        else:
+            # fallback: nimm Level 0 nur wenn du sicher bist, dass es nur einen Ticker ist
+            df.columns = [c[0] for c in df.columns]
+
+    df = df.rename(columns={c: str(c).lower() for c in df.columns})
+    keep = [c for c in ["open","high","low","close","volume"] if c in df.columns]
+    df = df[keep].copy()
+    df = df.loc[:, ~df.columns.duplicated()].copy()
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+class OhlcvFetcher(Protocol):
+    """Source of raw OHLCV bars for YFDataLoader.
+
+    fetch() returns the bars in [start, end) with lowercase OHLCV columns, an
+    empty frame if the source has none, or None if the request failed.
+    """
+
+    def fetch(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame | None: ...
+
+    def fetch_many(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame | None]:
+        """Same for several tickers in one request; may raise download.RateLimited."""
+        ...
+
+
+def _empty_ohlcv() -> pd.DataFrame:
+    return pd.DataFrame(columns=["open", "high", "low", "close", "volume"], index=pd.DatetimeIndex([]))
+
+
+@dataclass
+class YFinanceFetcher:
+    auto_adjust: bool = False
+
+    def fetch(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame | None:
+        try:
+            df = yf.download(tickers=ticker,start=start,end=end,interval=interval,group_by="column",auto_adjust=self.auto_adjust,progress=False,threads=False,)
+        except Exception as e:
+            log_kv(logger,logging.WARNING,"DATA_DOWNLOAD_FAIL",ticker=ticker,interval=interval,err=str(e),)
+            return None
+        if df is None or len(df) == 0:
+            return _empty_ohlcv()
+        return _normalize_ohlcv(df, ticker)
+
+    def fetch_many(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame | None]:
+        try:
+            df = yf.download(tickers=list(tickers),start=start,end=end,interval=interval,group_by="ticker",auto_adjust=self.auto_adjust,progress=False,threads=False,multi_level_index=True,)
+        except YFRateLimitError as e:
+            raise RateLimited(str(e)) from e
+        except Exception as e:
+            log_kv(logger,logging.WARNING,"DATA_DOWNLOAD_FAIL",tickers=len(tickers),interval=interval,err=str(e),)
+            return {t: None for t in tickers}
+
+        out: dict[str, pd.DataFrame | None] = {}
+        present = set(df.columns.get_level_values(0)) if df is not None and isinstance(df.columns, pd.MultiIndex) else set()
+        for t in tickers:
+            key = t.upper() if t.upper() in present else t
+            if key not in present:
+                out[t] = _empty_ohlcv()
+                continue
+            # the batch result is reindexed to the union of all timestamps; drop the padding
+            part = _normalize_ohlcv(df[key]).dropna(how="all")
+            out[t] = part
+        if len(tickers) > 1 and end - start >= pd.Timedelta(days=7) and all(len(v) == 0 for v in out.values()):
+            # yfinance swallows per-symbol errors, so a week without a single bar for the whole
+            # batch may be throttling, or just delisted symbols / a holiday: retried once
+            raise MaybeRateLimited(f"empty batch of {len(tickers)} tickers", out)
+        return out
+
+
+@dataclass
+class FrameFetcher:
+    """Offline fetcher serving slices of in-memory frames, keyed by (ticker, interval)."""
+    frames: dict[tuple[str, str], pd.DataFrame]
+
+    def fetch(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame | None:
+        df = self.frames.get((ticker, interval))
+        if df is None:
+            return _empty_ohlcv()
+        return window_frame(df, start, end).copy()
+
+    def fetch_many(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame | None]:
+        return {t: self.fetch(t, start, end, interval) for t in tickers}
+
+
 @dataclass
 class YFDataLoader:
     cfg: DataConfig
+    fetcher: OhlcvFetcher = field(default_factory=YFinanceFetcher)
 
     def __post_init__(self) -> None:
         _safe_mkdir(self.cfg.cache_dir)
-        # Build a lightweight in-memory index of cached OHLCV files to avoid
-        # repeated os.listdir()+regex scans on every request.
+        # Consolidated OHLCV store (one file per ticker/interval); nothing is scanned here,
+        # files are only opened when their ticker is requested.
+        self.store = OhlcvStore(os.path.join(self.cfg.cache_dir, "store")) if self.cfg.cache_dir else None
+        self._legacy_checked: set[tuple[str, str]] = set()
+        # every fetch goes through one rate-limited scheduler per loader
+        self.scheduler = DownloadScheduler(
+            self.fetcher,
+            TokenBucket(rate=self.cfg.download_rate_per_s, burst=self.cfg.download_burst),
+            batch_size=self.cfg.download_batch_size,
+            max_workers=self.cfg.max_workers,
+            max_retries=self.cfg.download_max_retries,
+            backoff_s=self.cfg.download_backoff_s,
+        )
         self._cache_lock = Lock()
-        self._cache_index: dict[tuple[str, str], list[str]] = {}
-        if self.cfg.cache_dir and os.path.exists(self.cfg.cache_dir):
-            try:
-                for fn in os.listdir(self.cfg.cache_dir):
-                    if not fn.endswith(".parquet"):
-                        continue
-                    parts = fn.split("__")
-                    if len(parts) < 4:
-                        continue
-                    safe_ticker, interval_l = parts[0], parts[1]
-                    self._cache_index.setdefault((safe_ticker, interval_l), []).append(fn)
-                # Prefer newest files first
-                for k, files in self._cache_index.items():
-                    files.sort(key=lambda f: os.path.getmtime(os.path.join(self.cfg.cache_dir, f)), reverse=True)
-            except Exception:
-                self._cache_index = {}
-
-    @staticmethod
-    def _normalize_ohlcv(df: pd.DataFrame, ticker: str | None = None) -> pd.DataFrame:
-        if isinstance(df.columns, pd.MultiIndex):
-            # robust: versuche in letzter Ebene den ticker zu finden
-            if ticker in df.columns.get_level_values(-1):
-                df = df.xs(ticker, axis=1, level=-1, drop_level=True)
-            else:
-                # fallback: nimm Level 0 nur wenn du sicher bist, dass es nur einen Ticker ist
-                df.columns = [c[0] for c in df.columns]
-
-        df = df.rename(columns={c: str(c).lower() for c in df.columns})
-        keep = [c for c in ["open","high","low","close","volume"] if c in df.columns]
-        df = df[keep].copy()
-        df = df.loc[:, ~df.columns.duplicated()].copy()
-        df.index = pd.to_datetime(df.index)
-        return df
+        # Earnings dates per ticker for the lifetime of this loader (one fetch per run).
+        self._calendar_lock = Lock()
+        self._calendar_mem: dict[str, pd.DatetimeIndex] = {}
 
     def get_ohlcv(self, ticker: str, start: str | None, end: str | None, interval: str = "1d") -> pd.DataFrame | None:
         """
-        Fetch OHLCV data via yfinance with disk caching.
+        Fetch OHLCV data via the fetcher with disk caching.
+
+        Returns the bars in [start, end). Only the parts of the window the store
+        does not cover yet are fetched; bars from today on are never marked as
+        covered, so the trailing edge is refreshed on every call.
         """
         interval_l = str(interval).lower()
 
@@ -127,80 +208,172 @@ class YFDataLoader:
             log_kv(logger,logging.WARNING,"DATA_WINDOW_INVALID",ticker=ticker,interval=interval_l,start=str(start_eff),end=str(end_eff),)
             return None
 
-        cache_path = None
-        if self.cfg.cache_dir:
-            os.makedirs(self.cfg.cache_dir, exist_ok=True)
-            start_key = start_eff.date().isoformat() if start_eff is not None else "NA"
-            end_key = end_eff.date().isoformat() if end_eff is not None else "NA"
-            safe_ticker = re.sub(r"[^A-Za-z0-9\-_\.]+", "_", ticker)
-            cache_name = f"{safe_ticker}__{interval_l}__{start_key}__{end_key}.parquet"
-            cache_path = os.path.join(self.cfg.cache_dir, cache_name)
-
-            pattern = rf"^{re.escape(safe_ticker)}__{re.escape(interval_l)}__.*__.*\.parquet$"
-
-            log_kv(logger,logging.INFO,"SEARCHING_CACHE",ticker=ticker)
-
-            # Fast path: consult in-memory cache index to avoid scanning the directory each call
-            with self._cache_lock:
-                candidates = list(self._cache_index.get((safe_ticker, interval_l), ()))
-
-            for filename in candidates:
-                try:
-                    df = self._normalize_ohlcv(pd.read_parquet(os.path.join(self.cfg.cache_dir, filename)))
-                    log_kv(logger, logging.DEBUG, "DATA_CACHE_HIT",
-                           ticker=ticker, interval=interval_l,
-                           path=os.path.join(self.cfg.cache_dir, filename),
-                           rows=len(df))
-                    return df
-                except Exception as e:
-                    log_kv(logger, logging.WARNING, "DATA_CACHE_READ_FAIL",
-                           ticker=ticker, interval=interval_l,
-                           path=os.path.join(self.cfg.cache_dir, filename),
-                           err=str(e))
+        if self.store is None:
+            log_kv(logger,logging.DEBUG,"DATA_DOWNLOAD",ticker=ticker,interval=interval_l,start=str(start_eff),end=str(end_eff),)
+            df = self.scheduler.fetch([(ticker, start_eff, end_eff)], interval_l).get((ticker, start_eff, end_eff))
+            if df is None or len(df) == 0:
+                log_kv(logger, logging.WARNING, "DATA_EMPTY_PRIMARY", ticker=ticker, interval=interval_l)
+                return None
+            return df
 
+        log_kv(logger,logging.INFO,"SEARCHING_CACHE",ticker=ticker)
+        self._import_legacy_cache(ticker, interval_l)
+        gaps = self.store.missing(ticker, interval_l, start_eff, end_eff)
+        fresh = self._fill_gaps(ticker, interval_l, gaps) if gaps else None
 
         try:
-            log_kv(logger,logging.DEBUG,"DATA_DOWNLOAD",ticker=ticker,interval=interval_l,start=str(start_eff),end=str(end_eff),)
-            df = yf.download(tickers=ticker,start=start_eff,end=end_eff,interval=interval_l,group_by="column",auto_adjust=False,progress=False,threads=False,)
+            df = self.store.read(ticker, interval_l, start_eff, end_eff)
         except Exception as e:
-            log_kv(logger,logging.WARNING,"DATA_DOWNLOAD_FAIL",ticker=ticker,interval=interval_l,err=str(e),)
+            log_kv(logger, logging.WARNING, "DATA_CACHE_READ_FAIL", ticker=ticker, interval=interval_l,
+                   path=self.store.path(ticker, interval_l), err=str(e))
             df = None
-
+        if df is None and fresh is not None:
+            df = window_frame(fresh, start_eff, end_eff)
         if df is None or len(df) == 0:
             log_kv(logger, logging.WARNING, "DATA_EMPTY_PRIMARY", ticker=ticker, interval=interval_l)
             return None
+        if not gaps:
+            log_kv(logger, logging.DEBUG, "DATA_CACHE_HIT", ticker=ticker, interval=interval_l,
+                   path=self.store.path(ticker, interval_l), rows=len(df))
+        return df
 
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = [c[0] for c in df.columns]
+    def prefetch_ohlcv(self, tickers: list[str], start: str | None, end: str | None, interval: str = "1d") -> None:
+        """Fill the store for many tickers with batched downloads.
 
-        df = df.rename(columns={c: c.lower() for c in df.columns})
-        keep = [c for c in ["open", "high", "low", "close", "volume"] if c in df.columns]
-        df = df[keep]
+        Later get_ohlcv calls for these tickers and this window are served from
+        disk. Without a cache_dir there is nowhere to keep the bars, so this is a no-op.
+        """
+        if self.store is None:
+            return
+        interval_l = str(interval).lower()
+        start_eff = pd.Timestamp(start).normalize()
+        end_eff = pd.Timestamp(end).normalize()
+        if start_eff >= end_eff:
+            return
+
+        gaps: dict[str, list[tuple[pd.Timestamp, pd.Timestamp]]] = {}
+        for t in dict.fromkeys(tickers):
+            self._import_legacy_cache(t, interval_l)
+            missing = self.store.missing(t, interval_l, start_eff, end_eff)
+            if missing:
+                gaps[t] = missing
+        if not gaps:
+            return
+
+        log_kv(logger, logging.INFO, "DATA_PREFETCH", tickers=len(gaps), interval=interval_l)
+        got = self.scheduler.fetch([(t, s, e) for t, g in gaps.items() for s, e in g], interval_l)
+        for t, g in gaps.items():
+            self._merge_fetched(t, interval_l, [(s, e, got.get((t, s, e))) for s, e in g])
+
+    def _fill_gaps(self, ticker: str, interval_l: str, gaps: list[tuple[pd.Timestamp, pd.Timestamp]]) -> pd.DataFrame | None:
+        """Fetch the missing ranges and merge them into the store; returns the fetched bars."""
+        for s, e in gaps:
+            log_kv(logger,logging.DEBUG,"DATA_DOWNLOAD",ticker=ticker,interval=interval_l,start=str(s),end=str(e),)
+        got = self.scheduler.fetch([(ticker, s, e) for s, e in gaps], interval_l)
+        return self._merge_fetched(ticker, interval_l, [(s, e, got.get((ticker, s, e))) for s, e in gaps])
+
+    def _merge_fetched(self, ticker: str, interval_l: str, parts: list[tuple[pd.Timestamp, pd.Timestamp, pd.DataFrame | None]]) -> pd.DataFrame | None:
+        today = pd.Timestamp(date.today())
+        had_data = bool(self.store.covered(ticker, interval_l))
+        # None means the range failed to download and stays missing
+        done = [(s, min(e, today)) for s, e, part in parts if part is not None]
+        fetched = [part for _, _, part in parts if part is not None and len(part) > 0]
+        if not fetched and not had_data:
+            # an empty answer only proves "no bars here" for a ticker the source knows
+            return None
+        fresh = pd.concat(fetched) if fetched else None
+        done = [(s, e) for s, e in done if s < e]
+        log_kv(logger, logging.INFO, "DATA_GAPS_FILLED", ticker=ticker, interval=interval_l, gaps=len(parts),
+               fetched=len(done), rows=0 if fresh is None else len(fresh))
 
-        if cache_path is not None:
-            try:
-                df = self._normalize_ohlcv(df)
-                df.to_parquet(cache_path, index=True)
-                fn = os.path.basename(cache_path)
-                with self._cache_lock:
-                    key = (safe_ticker, interval_l)
-                    lst = self._cache_index.setdefault(key, [])
-                    if fn in lst:
-                        lst.remove(fn)
-                    lst.insert(0, fn)
-            except Exception:
-                pass
+        try:
+            self.store.write(ticker, interval_l, fresh, done)
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "DATA_CACHE_WRITE_FAIL", ticker=ticker, interval=interval_l, err=str(e))
+        return fresh
+
+    def _import_legacy_cache(self, ticker: str, interval_l: str) -> None:
+        """Once per ticker/interval: fold old per-window parquet files into the store."""
+        key = (ticker, interval_l)
+        with self._cache_lock:
+            if key in self._legacy_checked:
+                return
+            self._legacy_checked.add(key)
+        if not self.store.covered(ticker, interval_l):
+            self.store.import_legacy(self.cfg.cache_dir, ticker, interval_l)
+
+    def _calendar_path(self, ticker: str) -> str | None:
+        if not self.cfg.cache_dir:
+            return None
+        return os.path.join(self.cfg.cache_dir, "calendar", f"{safe_name(ticker)}__earnings.parquet")
 
-        return df
+    @profiled("cache_read")
+    def _read_calendar_file(self, path: str | None, fresh_only: bool) -> pd.DatetimeIndex | None:
+        if path is None or not os.path.exists(path):
+            return None
+        age_h = (time.time() - os.path.getmtime(path)) / 3600.0
+        if fresh_only and age_h > float(self.cfg.calendar_ttl_hours):
+            return None
+        try:
+            return pd.DatetimeIndex(pd.read_parquet(path)["earnings_date"])
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "CALENDAR_CACHE_READ_FAIL", path=path, err=str(e))
+            return None
+
+    def _fetch_earnings_dates(self, ticker: str) -> pd.DatetimeIndex:
+        path = self._calendar_path(ticker)
+        dates = self._read_calendar_file(path, fresh_only=True)
+        if dates is not None:
+            log_kv(logger, logging.DEBUG, "CALENDAR_CACHE_HIT", ticker=ticker, rows=len(dates))
+            return dates
+
+        try:
+            log_kv(logger, logging.DEBUG, "CALENDAR_DOWNLOAD", ticker=ticker)
+            df = yf.Ticker(ticker).get_earnings_dates(limit=24)
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "CALENDAR_DOWNLOAD_FAIL", ticker=ticker, err=str(e))
+            # a stale file is still better than no calendar at all
+            stale = self._read_calendar_file(path, fresh_only=False)
+            return stale if stale is not None else pd.DatetimeIndex([])
+
+        if df is None or df.empty:
+            dates = pd.DatetimeIndex([])
+        else:
+            index = pd.to_datetime(df.index)
+            if index.tz is not None:
+                index = index.tz_convert(None)
+            dates = index.normalize().unique().sort_values()
+
+        if path is not None:
+            try:
+                _safe_mkdir(os.path.dirname(path))
+                pd.DataFrame({"earnings_date": dates}).to_parquet(path, index=False)
+            except Exception as e:
+                log_kv(logger, logging.WARNING, "CALENDAR_CACHE_WRITE_FAIL", ticker=ticker, err=str(e))
+        return dates
+
+    def prefetch_calendar(self, ticker: str) -> None:
+        """Warm the calendar store for a ticker (called from the prep workers)."""
+        self._earnings_dates(ticker)
+
+    def _earnings_dates(self, ticker: str) -> pd.DatetimeIndex:
+        with self._calendar_lock:
+            dates = self._calendar_mem.get(ticker)
+        if dates is None:
+            dates = self._fetch_earnings_dates(ticker)
+            with self._calendar_lock:
+                self._calendar_mem[ticker] = dates
+        return dates
 
     def get_calendar(self, ticker: str, start: date, end: date) -> List[pd.Timestamp]:
         """
-        Return yfinance earnings dates for a ticker as a DatetimeIndex.
+        Return yfinance earnings dates for a ticker within [start, end].
+
+        Dates are fetched once per ticker per loader and persisted under
+        cache_dir/calendar with a TTL of DataConfig.calendar_ttl_hours.
         """
-        ticker = yf.Ticker(ticker)
-        df = ticker.get_earnings_dates(limit = 24)
-        if df is None or df.empty:
+        index = self._earnings_dates(ticker)
+        if len(index) == 0:
             return []
-        index = pd.to_datetime(df.index).tz_convert(None).normalize()
         log_kv(logger,logging.DEBUG,"CALENDAR_FOUND",ticker=ticker,start=start, end= end)
-        return [pd.Timestamp(date.date()) for date in index[(index >= pd.Timestamp(start)) & (index <= pd.Timestamp(end))].unique()]
\ No newline at end of file
+        return [pd.Timestamp(date.date()) for date in index[(index >= pd.Timestamp(start)) & (index <= pd.Timestamp(end))].unique()]
@@ -0,0 +1,340 @@
+from __future__ import annotations
+import logging
+import queue
+from contextlib import contextmanager
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from threading import Lock
+from typing import Any, Callable, Iterator, List, Protocol
+
+import numpy as np
+import pandas as pd
+
+from .config import DataConfig, DBConfig
+from .data import aggregate_1d_from_1h
+from .logging import log_kv
+from .profiling import profiled
+logger = logging.getLogger(__name__)
+
+_OHLCV = ("open", "high", "low", "close", "volume")
+_TABLES = {"1h": "ohlcv_1h"}
+# Postgres binary timestamps count microseconds from 2000-01-01 UTC
+_PG_EPOCH_US = 946_684_800 * 10**6
+_PG_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# one row of the COPY below: field count, then (length, value) per field, big-endian
+_PG_ROW = np.dtype(
+    [("nfields", ">i2"), ("len_i", ">i4"), ("i", ">i4"), ("len_ts", ">i4"), ("ts", ">i8")]
+    + [f for c in _OHLCV for f in ((f"len_{c}", ">i4"), (c, ">f8"))]
+)
+
+_PG_OHLCV_COPY = """
+COPY (
+    SELECT k.i::int4, o.datetime,
+           coalesce(o.open, 'NaN'), coalesce(o.high, 'NaN'), coalesce(o.low, 'NaN'),
+           coalesce(o.close, 'NaN'), coalesce(o.volume, 'NaN')
+    FROM {table} o
+    JOIN unnest(%s::text[]) WITH ORDINALITY AS k(ticker, i) ON o.ticker = k.ticker
+    WHERE o.datetime >= %s AND o.datetime < %s
+    ORDER BY k.i, o.datetime
+) TO STDOUT (FORMAT BINARY)
+"""
+
+_DUCK_OHLCV = """
+SELECT ticker, epoch_us(datetime) AS ts_us, open, high, low, close, volume
+FROM {table}
+WHERE ticker IN (SELECT unnest(?)) AND datetime >= ? AND datetime < ?
+ORDER BY ticker, datetime
+"""
+
+_PG_EARNINGS = "SELECT ticker, earnings_date FROM earnings WHERE ticker = ANY(%s) ORDER BY ticker, earnings_date"
+_DUCK_EARNINGS = "SELECT ticker, earnings_date FROM earnings WHERE ticker IN (SELECT unnest(?)) ORDER BY ticker, earnings_date"
+
+
+class ConnectionPool:
+    """Fixed-size, thread-safe pool; connections are created lazily by `factory`."""
+
+    def __init__(self, factory: Callable[[], Any], size: int):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        except Exception:
+            # a failed statement may leave the connection unusable; replace it
+            self._discard(conn)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+
+    def _discard(self, conn: Any) -> None:
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def parse_pg_copy_binary(buf: bytes) -> np.ndarray:
+    """Rows of the binary COPY in _PG_OHLCV_COPY as a structured array (no per-row Python)."""
+    if len(buf) == 0:
+        return np.zeros(0, dtype=_PG_ROW)
+    if buf[:11] != _PG_SIGNATURE:
+        raise ValueError("not a binary COPY stream")
+    header = 19 + int.from_bytes(buf[15:19], "big")
+    body = len(buf) - header - 2  # trailer: int16 -1
+    if body % _PG_ROW.itemsize or buf[-2:] != b"\xff\xff":
+        raise ValueError("unexpected binary COPY layout")
+    rows = np.frombuffer(buf, dtype=_PG_ROW, offset=header, count=body // _PG_ROW.itemsize)
+    if len(rows) and not ((rows["nfields"] == 7).all() and (rows["len_ts"] == 8).all()):
+        raise ValueError("unexpected binary COPY row layout")
+    return rows
+
+
+def _frames(tickers: list[str], codes: np.ndarray, ts_us: np.ndarray, cols: dict[str, np.ndarray], tz: str) -> dict[str, pd.DataFrame]:
+    """Split column arrays sorted by ticker code into one OHLCV frame per ticker."""
+    out: dict[str, pd.DataFrame] = {}
+    if len(codes) == 0:
+        return out
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    idx_all = pd.DatetimeIndex(ts_us.astype("datetime64[us]"), name="datetime").tz_localize("UTC").tz_convert(tz)
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        out[tickers[int(codes[s])]] = pd.DataFrame({c: cols[c][s:e] for c in _OHLCV}, index=idx_all[s:e])
+    return out
+
+
+class DBSource(Protocol):
+    def read_ohlcv(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, table: str) -> dict[str, pd.DataFrame]: ...
+
+    def read_earnings(self, tickers: list[str]) -> dict[str, pd.DatetimeIndex]: ...
+
+    def close(self) -> None: ...
+
+
+class PostgresSource:
+    """Bulk reads from the TimescaleDB tables of db_schma.py over pooled psycopg connections.
+
+    Bars come back through one binary COPY per ticker batch and are decoded
+    with numpy straight from the wire format.
+    """
+
+    def __init__(self, cfg: DBConfig):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise ImportError("the postgres backend needs psycopg (pip install 'psycopg[binary]')") from e
+        self.cfg = cfg
+        self.pool = ConnectionPool(lambda: psycopg.connect(cfg.dsn, autocommit=True), cfg.pool_size)
+
+    def read_ohlcv(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, table: str) -> dict[str, pd.DataFrame]:
+        buf = bytearray()
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            with cur.copy(_PG_OHLCV_COPY.format(table=table), (tickers, start.to_pydatetime(), end.to_pydatetime())) as copy:
+                for chunk in copy:
+                    buf += chunk
+        rows = parse_pg_copy_binary(bytes(buf))
+        cols = {c: rows[c].astype(np.float64) for c in _OHLCV}
+        # ordinality is 1-based
+        return _frames(tickers, rows["i"].astype(np.int64) - 1, rows["ts"].astype(np.int64) + _PG_EPOCH_US, cols, self.cfg.tz)
+
+    def read_earnings(self, tickers: list[str]) -> dict[str, pd.DatetimeIndex]:
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(_PG_EARNINGS, (tickers,))
+            return _earnings_by_ticker(cur.fetchall())
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class DuckDBSource:
+    """Local DuckDB stand-in with the same ohlcv_1h / earnings tables, read as Arrow."""
+
+    def __init__(self, cfg: DBConfig):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("the duckdb backend needs duckdb (pip install duckdb)") from e
+        self.cfg = cfg
+        self._db = duckdb.connect(cfg.dsn or ":memory:", read_only=bool(cfg.dsn))
+        # cursors are independent connections to the same database, one per thread
+        self.pool = ConnectionPool(self._db.cursor, cfg.pool_size)
+
+    def read_ohlcv(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, table: str) -> dict[str, pd.DataFrame]:
+        with self.pool.connection() as cur:
+            tbl = cur.execute(_DUCK_OHLCV.format(table=table), [tickers, start.to_pydatetime(), end.to_pydatetime()]).fetch_arrow_table()
+        if tbl.num_rows == 0:
+            return {}
+        names = tbl.column("ticker").to_numpy(zero_copy_only=False)
+        order = {t: i for i, t in enumerate(tickers)}
+        codes = np.fromiter((order[t] for t in names), dtype=np.int64, count=len(names))
+        cols = {c: tbl.column(c).to_numpy(zero_copy_only=False).astype(np.float64) for c in _OHLCV}
+        return _frames(tickers, codes, tbl.column("ts_us").to_numpy().astype(np.int64), cols, self.cfg.tz)
+
+    def read_earnings(self, tickers: list[str]) -> dict[str, pd.DatetimeIndex]:
+        with self.pool.connection() as cur:
+            return _earnings_by_ticker(cur.execute(_DUCK_EARNINGS, [tickers]).fetchall())
+
+    def close(self) -> None:
+        self.pool.close()
+        self._db.close()
+
+
+def _earnings_by_ticker(rows: list[tuple]) -> dict[str, pd.DatetimeIndex]:
+    by: dict[str, list] = {}
+    for t, d in rows:
+        by.setdefault(t, []).append(d)
+    return {t: pd.DatetimeIndex(pd.to_datetime(ds)) for t, ds in by.items()}
+
+
+def make_source(cfg: DBConfig) -> DBSource:
+    if cfg.backend == "postgres":
+        return PostgresSource(cfg)
+    if cfg.backend == "duckdb":
+        return DuckDBSource(cfg)
+    raise ValueError(f"unknown db backend {cfg.backend!r}")
+
+
+@dataclass
+class DBDataLoader:
+    """Drop-in for YFDataLoader that reads bars and earnings dates from the database.
+
+    prefetch_ohlcv() loads many tickers with one bulk query per
+    DBConfig.query_batch_size tickers (also their earnings dates); get_ohlcv()
+    then serves the prefetched frames and only queries the database itself
+    for tickers that are not in memory. Frames stay in an LRU of two query
+    batches, so asking twice for the same window (the reference ticker, a
+    retried candidate) is no second query. Only 1h bars are stored; 1d is
+    aggregated from them.
+    """
+    cfg: DataConfig
+    db: DBConfig
+    source: DBSource | None = None
+    _bars: OrderedDict[tuple[str, str, pd.Timestamp, pd.Timestamp], pd.DataFrame | None] = field(default_factory=OrderedDict, init=False, repr=False)
+    _earnings: dict[str, pd.DatetimeIndex] = field(default_factory=dict, init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.source is None:
+            self.source = make_source(self.db)
+
+    def _window(self, start, end) -> tuple[pd.Timestamp, pd.Timestamp]:
+        return pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+
+    @profiled("cache_read")
+    def _query(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval_l: str) -> dict[str, pd.DataFrame]:
+        table = _TABLES.get("1h" if interval_l == "1d" else interval_l)
+        if table is None:
+            log_kv(logger, logging.WARNING, "DB_INTERVAL_UNSUPPORTED", interval=interval_l)
+            return {}
+        got = self.source.read_ohlcv(tickers, start.tz_localize(self.db.tz), end.tz_localize(self.db.tz), table)
+        if interval_l == "1d":
+            got = {t: aggregate_1d_from_1h(df) for t, df in got.items()}
+        log_kv(logger, logging.DEBUG, "DB_QUERY", tickers=len(tickers), found=len(got), interval=interval_l,
+               rows=sum(len(df) for df in got.values() if df is not None))
+        return got
+
+    def prefetch_ohlcv(self, tickers: list[str], start: str | None, end: str | None, interval: str = "1d") -> None:
+        interval_l = str(interval).lower()
+        start_eff, end_eff = self._window(start, end)
+        if start_eff >= end_eff:
+            return
+        with self._lock:
+            todo = [t for t in dict.fromkeys(tickers) if (t, interval_l, start_eff, end_eff) not in self._bars]
+        step = max(1, self.db.query_batch_size)
+        for i in range(0, len(todo), step):
+            chunk = todo[i:i + step]
+            got = self._query(chunk, start_eff, end_eff, interval_l)
+            with self._lock:
+                need = [t for t in chunk if t not in self._earnings]
+            earnings = self.source.read_earnings(need) if need else {}
+            with self._lock:
+                for t in chunk:
+                    self._remember((t, interval_l, start_eff, end_eff), got.get(t))
+                    self._earnings.setdefault(t, earnings.get(t, pd.DatetimeIndex([])))
+        if todo:
+            log_kv(logger, logging.INFO, "DB_PREFETCH", tickers=len(todo), queries=-(-len(todo) // step), interval=interval_l)
+
+    def _remember(self, key: tuple[str, str, pd.Timestamp, pd.Timestamp], df: pd.DataFrame | None) -> None:
+        """Put a frame into the LRU (caller holds _lock)."""
+        self._bars[key] = df
+        self._bars.move_to_end(key)
+        while len(self._bars) > 2 * max(1, self.db.query_batch_size):
+            self._bars.popitem(last=False)
+
+    def get_ohlcv(self, ticker: str, start: str | None, end: str | None, interval: str = "1d") -> pd.DataFrame | None:
+        """Bars in [start, end) from the database, or from the LRU of prefetched / earlier frames."""
+        interval_l = str(interval).lower()
+        start_eff, end_eff = self._window(start, end)
+        if start_eff >= end_eff:
+            log_kv(logger, logging.WARNING, "DATA_WINDOW_INVALID", ticker=ticker, interval=interval_l, start=str(start_eff), end=str(end_eff))
+            return None
+        key = (ticker, interval_l, start_eff, end_eff)
+        with self._lock:
+            hit = key in self._bars
+            if hit:
+                self._bars.move_to_end(key)
+                df = self._bars[key]
+        if not hit:
+            df = self._query([ticker], start_eff, end_eff, interval_l).get(ticker)
+            with self._lock:
+                self._remember(key, df)
+        if df is None or len(df) == 0:
+            log_kv(logger, logging.WARNING, "DATA_EMPTY_PRIMARY", ticker=ticker, interval=interval_l)
+            return None
+        return df
+
+    def _earnings_dates(self, ticker: str) -> pd.DatetimeIndex:
+        with self._lock:
+            dates = self._earnings.get(ticker)
+        if dates is None:
+            dates = self.source.read_earnings([ticker]).get(ticker, pd.DatetimeIndex([]))
+            with self._lock:
+                self._earnings[ticker] = dates
+        return dates
+
+    def prefetch_calendar(self, ticker: str) -> None:
+        self._earnings_dates(ticker)
+
+    def get_calendar(self, ticker: str, start: date, end: date) -> List[pd.Timestamp]:
+        """Earnings dates of a ticker within [start, end] from the earnings table."""
+        index = self._earnings_dates(ticker)
+        if len(index) == 0:
+            return []
+        return [pd.Timestamp(d.date()) for d in index[(index >= pd.Timestamp(start)) & (index <= pd.Timestamp(end))].unique()]
+
+    def close(self) -> None:
+        self.source.close()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+from dataclasses import astuple
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .aggregation import BarAggregator
+from .data import aggregate_1d_from_1h
+from .logging import log_kv
+from .profiling import profiled
+from .store import safe_name
+logger = logging.getLogger(__name__)
+
+_DAY_NS = 86_400 * 10**9
+_HASHES_KEY = b"backtest_v15.source_hashes"
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer on uint64 arrays (wrapping arithmetic)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _M1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _bits(a: np.ndarray) -> np.ndarray:
+    if np.issubdtype(a.dtype, np.floating):
+        a = np.where(np.isnan(a), np.nan, a).astype(np.float64)
+    else:
+        a = a.astype(np.int64)
+    return a.view(np.uint64)
+
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit content hash per row over timestamp and OHLCV values."""
+    h = _mix(_bits(pd.DatetimeIndex(df.index).as_unit("ns").asi8))
+    for k in ("open", "high", "low", "close", "volume"):
+        h = _mix(h ^ _bits(df[k].to_numpy()))
+    return h
+
+
+def _group_hashes(keys: np.ndarray, row_hash: np.ndarray) -> dict[int, int]:
+    """Order-independent hash of the rows in each group (keys must be sorted)."""
+    if len(keys) == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sums = np.add.reduceat(row_hash, starts)
+    return dict(zip(keys[starts].tolist(), sums.tolist()))
+
+
+def _wall_days(idx: pd.DatetimeIndex, ceil: bool = False) -> np.ndarray:
+    """Local calendar day number of each timestamp (in the index's own timezone)."""
+    wall = (idx.tz_localize(None) if idx.tz is not None else idx).as_unit("ns").asi8
+    return -((-wall) // _DAY_NS) if ceil else wall // _DAY_NS
+
+
+class DerivedBarCache:
+    """Persisted 4H and daily bars derived from 1H bars, reused day by day.
+
+    Every derived bar depends on the 1H bars of one calendar day only (a 4H
+    block on its session day, a daily bar on the day bin it closes). Per day
+    the cache keeps a content hash of those 1H bars next to the derived rows,
+    so a later call only aggregates days whose bars are new or changed: a warm
+    run skips aggregation, a run with a day more data aggregates one day.
+    Entries live under <root>/<AggregationConfig hash>/.
+    """
+
+    def __init__(self, root: str, aggregator: BarAggregator):
+        cfg_key = hashlib.sha256(repr(astuple(aggregator.cfg)).encode("utf-8")).hexdigest()[:16]
+        self.root = os.path.join(root, cfg_key)
+        self.aggregator = aggregator
+        self._lock = Lock()
+        self._ticker_locks: dict[str, Lock] = {}
+
+    def path(self, ticker: str, kind: str) -> str:
+        return os.path.join(self.root, f"{safe_name(ticker)}__{kind}.parquet")
+
+    def _key_lock(self, ticker: str) -> Lock:
+        with self._lock:
+            return self._ticker_locks.setdefault(ticker, Lock())
+
+    def derive(self, ticker: str, d1h: pd.DataFrame) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
+        """(4H bars, daily bars) of d1h, equal to aggregating it from scratch."""
+        if d1h is None or len(d1h) == 0:
+            return self.aggregator.to_4h_session_aware(d1h), aggregate_1d_from_1h(d1h)
+        if not d1h.index.is_monotonic_increasing:
+            d1h = d1h.sort_index()
+        rows = _row_hashes(d1h)
+        idx = pd.DatetimeIndex(d1h.index)
+
+        with self._key_lock(ticker):
+            b4 = self._derive_part(
+                ticker, "4h", d1h, rows,
+                keys=_wall_days(self.aggregator._local_index(idx)),
+                out_keys=lambda out: _wall_days(pd.DatetimeIndex(out.index)),
+                build=self.aggregator.to_4h_session_aware,
+            )
+            # daily bins are (d - 1, d], labelled with their right edge
+            d1 = self._derive_part(
+                ticker, "1d", d1h, rows,
+                keys=_wall_days(idx, ceil=True),
+                out_keys=lambda out: _wall_days(pd.DatetimeIndex(out.index)),
+                build=aggregate_1d_from_1h,
+            )
+        return b4, d1
+
+    @profiled("cache_read")
+    def _read(self, path: str, tz: str) -> tuple[pd.DataFrame | None, dict[int, int]]:
+        if not os.path.exists(path):
+            return None, {}
+        try:
+            table = pq.read_table(path)
+            raw = json.loads((table.schema.metadata or {}).get(_HASHES_KEY, b"{}"))
+            if raw.get("tz") != tz:
+                # days of a source in another timezone are different day bins
+                return None, {}
+            return table.to_pandas(), {int(k): int(v) for k, v in raw["days"].items()}
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "DERIVED_READ_FAIL", path=path, err=str(e))
+            return None, {}
+
+    def _write(self, path: str, df: pd.DataFrame, tz: str, hashes: dict[int, int]) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        meta = dict(table.schema.metadata or {})
+        raw = {"tz": tz, "days": {str(k): str(v) for k, v in hashes.items()}}
+        meta[_HASHES_KEY] = json.dumps(raw).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        pq.write_table(table.replace_schema_metadata(meta), tmp)
+        os.replace(tmp, path)
+
+    def _derive_part(self, ticker: str, kind: str, d1h: pd.DataFrame, rows: np.ndarray, keys: np.ndarray,
+                     out_keys: Callable[[pd.DataFrame], np.ndarray], build: Callable[[pd.DataFrame], pd.DataFrame | None]) -> pd.DataFrame | None:
+        path = self.path(ticker, kind)
+        hashes = _group_hashes(keys, rows)
+        tz = str(pd.DatetimeIndex(d1h.index).tz)
+        cached, cached_hashes = self._read(path, tz)
+        reuse = [g for g, h in hashes.items() if cached_hashes.get(g) == h] if cached is not None else []
+
+        todo = ~np.isin(keys, reuse)
+        fresh = build(d1h[todo]) if todo.any() else None
+        kept = cached[np.isin(out_keys(cached), reuse)] if reuse else None
+
+        parts = [p for p in (kept, fresh) if p is not None and len(p) > 0]
+        if not parts:
+            out = build(d1h)
+        elif len(parts) == 1:
+            out = parts[0]
+        else:
+            kept = kept.set_axis(kept.index.as_unit(fresh.index.unit))
+            out = pd.concat([kept, fresh]).sort_index()
+        log_kv(logger, logging.DEBUG, "DERIVED_BARS", ticker=ticker, kind=kind, days=len(hashes), reused=len(reuse))
+
+        if todo.any() or hashes != cached_hashes:
+            try:
+                if out is not None:
+                    self._write(path, out, tz, hashes)
+            except Exception as e:
+                log_kv(logger, logging.WARNING, "DERIVED_WRITE_FAIL", ticker=ticker, kind=kind, err=str(e))
+        return out
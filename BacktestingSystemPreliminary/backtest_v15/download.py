@@ -0,0 +1,148 @@
+from __future__ import annotations
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any
+
+import pandas as pd
+
+from .logging import log_kv
+from .profiling import profiled
+logger = logging.getLogger(__name__)
+
+# (ticker, start, end) of one missing range
+Request = tuple[str, pd.Timestamp, pd.Timestamp]
+
+
+class RateLimited(Exception):
+    """Raised by a fetcher when the provider throttles us; the scheduler backs off and retries."""
+
+
+class MaybeRateLimited(RateLimited):
+    """Raised by a fetcher when an answer only looks throttled (e.g. an all-empty batch).
+
+    The scheduler retries once; if the answer is the same, `result` is taken
+    as the real answer instead of backing off further.
+    """
+
+    def __init__(self, msg: str, result: dict[str, pd.DataFrame | None]):
+        super().__init__(msg)
+        self.result = result
+
+
+@dataclass
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `burst` saved up.
+
+    acquire(n) may take more than `burst` tokens; the bucket then goes into
+    debt and the caller sleeps until it is paid off. pause() stops every
+    caller for a while after the provider signalled throttling.
+    """
+    rate: float
+    burst: float
+    _tokens: float = field(default=0.0, init=False)
+    _last: float = field(default_factory=time.monotonic, init=False)
+    _paused_until: float = field(default=0.0, init=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._tokens = float(self.burst)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n tokens, sleeping as long as needed; returns the time slept."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= n
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+@dataclass
+class DownloadScheduler:
+    """Turns many per-ticker missing ranges into few rate-limited batch requests.
+
+    Requests sharing the same [start, end) are grouped into batches of up to
+    batch_size tickers and sent through fetcher.fetch_many (or fetch, one by
+    one, for fetchers without it). Each ticker costs one token. A throttled
+    batch pauses the bucket with exponential backoff and is retried; a batch
+    that only looks throttled (MaybeRateLimited) is retried once.
+    """
+    fetcher: Any
+    bucket: TokenBucket
+    batch_size: int = 50
+    max_workers: int = 4
+    max_retries: int = 4
+    backoff_s: float = 5.0
+
+    def batches(self, requests: list[Request]) -> list[tuple[list[str], pd.Timestamp, pd.Timestamp]]:
+        groups: dict[tuple[pd.Timestamp, pd.Timestamp], list[str]] = {}
+        for ticker, start, end in requests:
+            groups.setdefault((start, end), []).append(ticker)
+        out = []
+        for (start, end), tickers in groups.items():
+            tickers = list(dict.fromkeys(tickers))
+            for i in range(0, len(tickers), max(1, self.batch_size)):
+                out.append((tickers[i:i + self.batch_size], start, end))
+        return out
+
+    @profiled("download")
+    def _fetch_batch(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame | None]:
+        fetch_many = getattr(self.fetcher, "fetch_many", None)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(len(tickers))
+            try:
+                if fetch_many is not None:
+                    return fetch_many(tickers, start, end, interval)
+                return {t: self.fetcher.fetch(t, start, end, interval) for t in tickers}
+            except MaybeRateLimited as e:
+                if attempt >= 1:
+                    log_kv(logger, logging.INFO, "DOWNLOAD_EMPTY_BATCH", tickers=len(tickers), start=str(start), end=str(end))
+                    return e.result
+                log_kv(logger, logging.INFO, "DOWNLOAD_EMPTY_RETRY", tickers=len(tickers), backoff_s=self.backoff_s, err=str(e))
+                self.bucket.pause(self.backoff_s)
+            except RateLimited as e:
+                delay = self.backoff_s * (2 ** attempt)
+                log_kv(logger, logging.WARNING, "DOWNLOAD_THROTTLED", tickers=len(tickers), attempt=attempt + 1, backoff_s=delay, err=str(e))
+                self.bucket.pause(delay)
+        log_kv(logger, logging.WARNING, "DOWNLOAD_GIVE_UP", tickers=len(tickers), start=str(start), end=str(end))
+        return {t: None for t in tickers}
+
+    def fetch(self, requests: list[Request], interval: str) -> dict[Request, pd.DataFrame | None]:
+        """Fetch all requests; None marks a range that could not be downloaded."""
+        batches = self.batches(requests)
+        if not batches:
+            return {}
+        log_kv(logger, logging.DEBUG, "DOWNLOAD_SCHEDULE", requests=len(requests), batches=len(batches), interval=interval)
+
+        def run(batch):
+            tickers, start, end = batch
+            got = self._fetch_batch(tickers, start, end, interval)
+            return {(t, start, end): got.get(t) for t in tickers}
+
+        out: dict[Request, pd.DataFrame | None] = {}
+        if len(batches) == 1 or self.max_workers <= 1:
+            for b in batches:
+                out.update(run(b))
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as ex:
+                for part in ex.map(run, batches):
+                    out.update(part)
+        return out
@@ -6,6 +6,7 @@ import pandas as pd
 
 from .config import SlippageConfig, RiskConfig
 from .logging import log_kv
+from .profiling import profiled
 logger = logging.getLogger(__name__)
 from .types import Position
 from .features import FeatureSnapshot
@@ -17,6 +18,7 @@ class SlippageModel:
     def __post_init__(self):
         self.rng = random.Random(self.cfg.seed)
 
+    @profiled("portfolio")
     def apply(self, price: float, atr: float|None, side: str) -> float:
         log_kv(logger, logging.DEBUG, "SLIPPAGE_APPLY", price=price, atr=atr, side=side)
         if atr is None or atr <= 0:
@@ -31,6 +33,7 @@ class SlippageModel:
 class RiskEngine:
     cfg: RiskConfig
 
+    @profiled("portfolio")
     def risk_pct(self, equity: float, equity_high: float, dd: float, regime: str, catalyst_class: str) -> float:
         log_kv(logger, logging.DEBUG, "RISK_PCT", equity=equity, equity_high=equity_high, dd=dd, regime=regime, catalyst_class=catalyst_class)
         # factors per v1.5
@@ -62,6 +65,7 @@ class RiskEngine:
         return float(rp)
 
     @staticmethod
+    @profiled("portfolio")
     def position_size(equity: float, risk_pct: float, entry: float, stop: float) -> float:
         log_kv(logger, logging.DEBUG, "POSITION_SIZE", equity=equity, risk_pct=risk_pct, entry=entry, stop=stop)
         money_risk = equity * risk_pct
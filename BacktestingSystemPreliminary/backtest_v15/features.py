@@ -8,9 +8,10 @@ import pandas as pd
 
 from .config import StrategyConfig
 from .logging import log_kv
+from .profiling import profiled
 logger = logging.getLogger(__name__)
 from .indicators import atr, rolling_range, sma
-from .structure import is_hh_hl, last_higher_low_close, detect_swings_close_only
+from .structure import SwingPoints, is_hh_hl, last_higher_low_close, detect_swings_close_only
 
 @dataclass
 class FeatureSnapshot:
@@ -33,6 +34,7 @@ class FeatureBuilder:
     def __init__(self, cfg: StrategyConfig):
         self.cfg = cfg
 
+    @profiled("features")
     def snapshot(self, bars_4h: pd.DataFrame, asof_idx: int) -> FeatureSnapshot:
         """Compute the feature snapshot at a specific bar index.
 
@@ -48,11 +50,7 @@ class FeatureBuilder:
             return FeatureSnapshot(False, None, None, None, None, None, None, None, None)
         df = bars_4h.iloc[: asof_idx + 1].copy()
 
-        required = max(
-            int(getattr(self.cfg, "range_20d_bars", 120)),
-            int(getattr(self.cfg, "atr_len", 14)) + int(getattr(self.cfg, "atr_ma_len", 20)) + 5,
-            60,
-        )
+        required = self._required_bars()
         if len(df) < required:
             log_kv(logger, logging.DEBUG, "FEATURE_INSUFFICIENT", have=len(df), need=required)
             return FeatureSnapshot(False, None, None, None, None, None, None, None, None, None)
@@ -63,14 +61,16 @@ class FeatureBuilder:
         df["R5"] = rolling_range(df, int(self.cfg.range_5d_bars))
         df["R20"] = rolling_range(df, int(self.cfg.range_20d_bars))
 
-        hh_hl = is_hh_hl(df["close"], 2, 2)
-        last_hl = last_higher_low_close(df["close"], 2, 2)
+        # one swing detection per snapshot, shared by structure and pullback metrics
+        swings = detect_swings_close_only(df["close"], 2, 2)
+        hh_hl = is_hh_hl(df["close"], 2, 2, swings=swings)
+        last_hl = last_higher_low_close(df["close"], 2, 2, swings=swings)
 
         atr_v = float(df["ATR"].iloc[-1]) if pd.notna(df["ATR"].iloc[-1]) else None
         atr_ma_v = float(df["ATR_MA"].iloc[-1]) if pd.notna(df["ATR_MA"].iloc[-1]) else None
         atr_ratio = (atr_v / atr_ma_v) if (atr_v is not None and atr_ma_v not in (None, 0.0) and pd.notna(atr_ma_v)) else None
 
-        pb, retrace, vol_pb, vol_imp = self._pullback_metrics(df)
+        pb, retrace, vol_pb, vol_imp = self._pullback_metrics(df, swings)
 
         r5 = float(df["R5"].iloc[-1]) if pd.notna(df["R5"].iloc[-1]) else None
         r20 = float(df["R20"].iloc[-1]) if pd.notna(df["R20"].iloc[-1]) else None
@@ -107,11 +107,119 @@ class FeatureBuilder:
 
 
 
-    def _pullback_metrics(self, df: pd.DataFrame):
+    @profiled("features")
+    def build_frame(self, bars_4h: pd.DataFrame) -> pd.DataFrame:
+        """Compute the feature snapshot for every bar in one causal pass.
+
+        Row i equals snapshot(bars_4h, i): a swing only counts from the bar that
+        confirms it (right=2 bars later), so no row looks ahead. Columns are the
+        FeatureSnapshot fields; use snapshot_at() for O(1) row lookups.
+        """
+        cols = list(FeatureSnapshot.__dataclass_fields__)
+        if bars_4h is None or len(bars_4h) == 0:
+            log_kv(logger, logging.DEBUG, "FEATURE_EMPTY_INPUT")
+            return pd.DataFrame(columns=cols)
+
+        n = len(bars_4h)
+        required = self._required_bars()
+        close = bars_4h["close"].to_numpy(dtype=float)
+        high = bars_4h["high"].to_numpy(dtype=float)
+        low = bars_4h["low"].to_numpy(dtype=float)
+        volume = bars_4h["volume"].to_numpy(dtype=float)
+
+        out = pd.DataFrame(index=bars_4h.index)
+        out["atr"] = atr(bars_4h, int(self.cfg.atr_len))
+        out["atr_ma"] = sma(out["atr"], int(self.cfg.atr_ma_len))
+        out["range5"] = rolling_range(bars_4h, int(self.cfg.range_5d_bars))
+        out["range20"] = rolling_range(bars_4h, int(self.cfg.range_20d_bars))
+
+        # last / previous confirmed swing positions as of every bar (-1 = none yet)
+        swings = detect_swings_close_only(bars_4h["close"], 2, 2)
+        hi_last, hi_prev = _confirmed_pivots(np.flatnonzero(swings.swing_high.to_numpy()), 2, n)
+        lo_last, lo_prev = _confirmed_pivots(np.flatnonzero(swings.swing_low.to_numpy()), 2, n)
+
+        have_two = (hi_prev >= 0) & (lo_prev >= 0)
+        out["hh_hl"] = have_two & (close[hi_last] > close[hi_prev]) & (close[lo_last] > close[lo_prev])
+        out["last_hl_close"] = np.where(lo_last >= 0, close[lo_last], np.nan)
+
+        pb = np.zeros(n)
+        retrace = np.full(n, np.nan)
+        vol_pb = np.full(n, np.nan)
+        vol_imp = np.full(n, np.nan)
+
+        # (last_low, last_high) only changes when a new pivot is confirmed, so
+        # each constant segment shares one impulse and one growing pullback.
+        change = np.flatnonzero((np.diff(lo_last) != 0) | (np.diff(hi_last) != 0)) + 1
+        starts = np.r_[0, change]
+        ends = np.r_[change, n]
+        for a, b in zip(starts, ends):
+            l, h = int(lo_last[a]), int(hi_last[a])
+            if l < 0 or h < 0 or l >= h:
+                continue
+            rows = np.arange(a, b)
+            imp_low = np.nanmin(low[l:h + 1])
+            imp_high = np.nanmax(high[l:h + 1])
+            rng = imp_high - imp_low
+            vol_imp[a:b] = volume[l:h + 1].mean()
+
+            pb[a:b] = rows - h
+            pb_low = np.fmin.accumulate(low[h + 1:b])[rows - h - 1]
+            pb_vol = (np.cumsum(volume[h + 1:b]) / np.arange(1, b - h))[rows - h - 1]
+            vol_pb[a:b] = pb_vol
+            if rng > 0:
+                retrace[a:b] = (imp_high - pb_low) / rng
+
+        out["pullback_bars"] = pb
+        out["pullback_retrace"] = retrace
+        out["vol_pullback_avg"] = vol_pb
+        out["vol_impulse_avg"] = vol_imp
+
+        # bars before the warm-up length get the same empty snapshot as snapshot()
+        warm = np.arange(n) < required - 1
+        out.loc[warm, [c for c in cols if c != "hh_hl"]] = np.nan
+        out.loc[warm, "hh_hl"] = False
+
+        log_kv(logger, logging.DEBUG, "FEATURE_FRAME_OK", rows=n, warmup=int(warm.sum()))
+        return out[cols]
+
+    @staticmethod
+    @profiled("features")
+    def snapshot_at(frame: pd.DataFrame, idx: int) -> FeatureSnapshot:
+        """O(1) FeatureSnapshot lookup into a frame produced by build_frame()."""
+        if frame is None or idx < 0 or idx >= len(frame):
+            return FeatureSnapshot(False, None, None, None, None, None, None, None, None, None)
+        row = frame.iloc[int(idx)]
+
+        def _opt(v):
+            return float(v) if pd.notna(v) else None
+
+        pb = row["pullback_bars"]
+        return FeatureSnapshot(
+            hh_hl=bool(row["hh_hl"]),
+            last_hl_close=_opt(row["last_hl_close"]),
+            atr=_opt(row["atr"]),
+            atr_ma=_opt(row["atr_ma"]),
+            range5=_opt(row["range5"]),
+            range20=_opt(row["range20"]),
+            pullback_bars=int(pb) if pd.notna(pb) else None,
+            pullback_retrace=_opt(row["pullback_retrace"]),
+            vol_pullback_avg=_opt(row["vol_pullback_avg"]),
+            vol_impulse_avg=_opt(row["vol_impulse_avg"]),
+        )
+
+    def _required_bars(self) -> int:
+        return max(
+            int(getattr(self.cfg, "range_20d_bars", 120)),
+            int(getattr(self.cfg, "atr_len", 14)) + int(getattr(self.cfg, "atr_ma_len", 20)) + 5,
+            60,
+        )
+
+    def _pullback_metrics(self, df: pd.DataFrame, swings: SwingPoints | None = None):
         if df is None or len(df) < 5:
             return 0, None, None, None
 
-        swings = detect_swings_close_only(df["close"], 2, 2)
+        if swings is None:
+            swings = detect_swings_close_only(df["close"], 2, 2)
 
         low_idx = df.index[swings.swing_low].tolist()
         high_idx = df.index[swings.swing_high].tolist()
@@ -144,3 +252,17 @@ class FeatureBuilder:
         vol_pb = pullback["volume"].mean() if pullback_bars > 0 else None
 
         return pullback_bars, retrace, vol_pb, vol_imp
+
+
+def _confirmed_pivots(pos: np.ndarray, right: int, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of the last and previous pivot known at each bar (-1 if none).
+
+    A pivot at p is only visible from bar p + right, when its window is complete.
+    """
+    last = np.full(n, -1, dtype=np.int64)
+    prev = np.full(n, -1, dtype=np.int64)
+    conf = pos + right
+    keep = conf < n
+    last[conf[keep]] = pos[keep]
+    prev[conf[keep]] = np.r_[-1, pos[:-1]][keep]
+    return np.maximum.accumulate(last), np.maximum.accumulate(prev)
@@ -1,11 +1,18 @@
 import logging
 from pathlib import Path
 from typing import Any
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
 import glob
+import json
 import os
+import queue
+import threading
+import time
 
 _LOG_INITIALISED = False
+_EVENT_SINK: "EventSink | None" = None
+_LISTENER: QueueListener | None = None
 
 class PrefixFilter(logging.Filter):
     def __init__(self, prefix: str):
@@ -46,6 +53,136 @@ def _rotating_file_handler(
     h.setFormatter(fmt)
     return h
 
+class EventSink:
+    """Compact sink for the high-volume DEBUG event stream.
+
+    log_kv hands (time, logger, level, event, fields) tuples to a bounded
+    queue without formatting anything; a background thread serializes them
+    as one JSON object per line. When the queue is full the event is dropped
+    and counted instead of blocking the caller.
+    """
+
+    def __init__(self, path: Path, level: int = logging.DEBUG, max_queue: int = 100_000, batch: int = 1000):
+        self.path = Path(path)
+        self.level = level
+        self.batch = batch
+        self.dropped = 0
+        self.written = 0
+        self._q: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="log-event-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, name: str, level: int, event: str, fields: dict[str, Any]) -> None:
+        try:
+            self._q.put_nowait((time.time(), name, level, event, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            done = False
+            while not done:
+                items = [self._q.get()]
+                while len(items) < self.batch:
+                    try:
+                        items.append(self._q.get_nowait())
+                    except queue.Empty:
+                        break
+                lines = []
+                for item in items:
+                    if item is None:
+                        done = True
+                        continue
+                    ts, name, level, event, fields = item
+                    rec = {"ts": ts, "logger": name, "level": logging.getLevelName(level), "event": event, **fields}
+                    lines.append(json.dumps(rec, default=str))
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                    self.written += len(lines)
+                if done or self._q.empty():
+                    f.flush()
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._q.put(None)
+        self._thread.join()
+        if self.dropped:
+            logging.getLogger("backtest_v15").warning("Event sink dropped %d events (queue full)", self.dropped)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler on a bounded queue that never blocks the caller for routine records.
+
+    Below WARNING a record is dropped and counted when the queue is full;
+    WARNING and above wait for room so problems are never lost.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped: dict[str, int] = {}
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+
+def _close_event_sink() -> None:
+    global _EVENT_SINK
+    sink, _EVENT_SINK = _EVENT_SINK, None
+    if sink is not None:
+        sink.close()
+
+
+def shutdown_logging() -> None:
+    """Flush the event sink and the log queue; safe to call more than once."""
+    global _LISTENER
+    _close_event_sink()
+    listener, _LISTENER = _LISTENER, None
+    if listener is None:
+        return
+    listener.stop()
+    for h in logging.getLogger().handlers:
+        if isinstance(h, DroppingQueueHandler) and h.dropped:
+            for target in listener.handlers:
+                if target.level <= logging.WARNING:
+                    target.handle(logging.makeLogRecord({
+                        "name": "backtest_v15", "levelno": logging.WARNING, "levelname": "WARNING",
+                        "msg": "Log queue dropped records under load: %s", "args": (h.dropped,),
+                    }))
+
+
+def _after_fork_in_child() -> None:
+    """Background threads do not survive fork; a forked worker logs synchronously.
+
+    Pool workers may leave via os._exit without flushing a queue, so the child
+    writes straight to the inherited handlers, as before the queue existed.
+    """
+    global _EVENT_SINK, _LISTENER
+    # the sink's writer is gone and its file belongs to the parent
+    _EVENT_SINK = None
+    listener, _LISTENER = _LISTENER, None
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, DroppingQueueHandler):
+            root.removeHandler(h)
+    for h in listener.handlers:
+        root.addHandler(h)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 def setup_logging(
         *,
         log_dir: str = "logs",
@@ -54,8 +191,19 @@ def setup_logging(
         overwrite: bool = True,
         max_bytes: int = 5_000_000,
         backup_count: int = 10,
+        event_sink: bool = False,
+        queue_size: int = 50_000,
 ) -> Path:
-    global _LOG_INITIALISED
+    """Console plus rotating per-subsystem files under log_dir.
+
+    The root logger level is the lowest of console_level and file_level, so
+    disabled levels cost one isEnabledFor check in log_kv. With event_sink,
+    log_kv DEBUG events go to <log_dir>/events.jsonl through an EventSink
+    instead of the text files. With queue_size > 0 the root logger only
+    enqueues records and one listener thread writes them to all handlers;
+    queue_size=0 writes synchronously from the logging thread.
+    """
+    global _LOG_INITIALISED, _EVENT_SINK, _LISTENER
 
     log_path = Path(log_dir)
     log_path.mkdir(parents=True, exist_ok=True)
@@ -65,7 +213,7 @@ def setup_logging(
         return log_path
 
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
+    root.setLevel(min(console_level, file_level))
 
     # Remove existing handlers
     for h in list(root.handlers):
@@ -78,13 +226,15 @@ def setup_logging(
 
     # Wipe old logs on each run if requested
     if overwrite:
-        _wipe_logs(log_path, ["backtest.log", "system.log", "data.log", "universe.log"])
+        _wipe_logs(log_path, ["backtest.log", "system.log", "data.log", "universe.log", "events.jsonl"])
+
+    handlers: list[logging.Handler] = []
 
     # Console (high-level)
     ch = logging.StreamHandler()
     ch.setLevel(console_level)
     ch.setFormatter(fmt)
-    root.addHandler(ch)
+    handlers.append(ch)
 
     # Root file (everything)
     root_file = _rotating_file_handler(
@@ -95,26 +245,46 @@ def setup_logging(
         backup_count,
         overwrite,
         )
-    root.addHandler(root_file)
+    handlers.append(root_file)
 
     # Split by subsystem (optional but recommended)
     system_h = _rotating_file_handler(log_path / "system.log", file_level, fmt, max_bytes, backup_count, overwrite)
     system_h.addFilter(PrefixFilter("backtest_v15"))
-    root.addHandler(system_h)
+    handlers.append(system_h)
 
     data_h = _rotating_file_handler(log_path / "data.log", file_level, fmt, max_bytes, backup_count, overwrite)
     data_h.addFilter(PrefixFilter("backtest_v15.data"))
-    root.addHandler(data_h)
+    handlers.append(data_h)
 
     uni_h = _rotating_file_handler(log_path / "universe.log", file_level, fmt, max_bytes, backup_count, overwrite)
     uni_h.addFilter(PrefixFilter("backtest_v15.universe"))
-    root.addHandler(uni_h)
+    handlers.append(uni_h)
+
+    if queue_size > 0:
+        qh = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        root.addHandler(qh)
+        _LISTENER = QueueListener(qh.queue, *handlers, respect_handler_level=True)
+        _LISTENER.start()
+    else:
+        for h in handlers:
+            root.addHandler(h)
+
+    if event_sink:
+        _EVENT_SINK = EventSink(log_path / "events.jsonl")
+    atexit.register(shutdown_logging)
 
     _LOG_INITIALISED = True
-    logging.getLogger("backtest_v15").info("Logging initialised (rotating, multi-file) dir=%s", str(log_path))
+    logging.getLogger("backtest_v15").info("Logging initialised (rotating, multi-file%s) dir=%s",
+                                           ", queued" if queue_size > 0 else "", str(log_path))
     return log_path
 
 def log_kv(logger: logging.Logger, level: int, event: str, **fields: Any) -> None:
+    sink = _EVENT_SINK
+    if sink is not None and level <= sink.level:
+        sink.emit(logger.name, level, event, fields)
+        return
+    if not logger.isEnabledFor(level):
+        return
     if fields:
         parts = []
         for k, v in fields.items():
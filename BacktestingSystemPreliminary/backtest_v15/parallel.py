@@ -0,0 +1,108 @@
+from __future__ import annotations
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import pandas as pd
+
+from .backtest import BacktestParams
+from .catalyst import CatalystEngine
+from .columnar import ColumnarBacktester, assemble_grid, ticker_columns
+from .config import RegimeConfig, StrategyConfig
+from .features import FeatureBuilder
+from .logging import log_kv
+from .portfolio import Portfolio
+from .regime import RegimeEngine
+from .shared import SharedFrames, attach_frames, share_frames
+from .strategy_v15 import StrategyV15, reason_stats
+logger = logging.getLogger(__name__)
+
+
+# per-process state of a signal worker (attached frames and configs)
+_WORKER: dict[str, Any] = {}
+
+
+def _init_worker(bars_layout: SharedFrames, daily_layout: SharedFrames, strat_cfg: StrategyConfig, regime_cfg: RegimeConfig) -> None:
+    shm_b, bars_4h = attach_frames(bars_layout)
+    shm_d, daily = attach_frames(daily_layout)
+    _WORKER.update(shm=(shm_b, shm_d), bars_4h=bars_4h, daily=daily, strat_cfg=strat_cfg, regime_cfg=regime_cfg)
+
+
+def ticker_signals(ticker: str, bars_4h: pd.DataFrame, daily: pd.DataFrame | None, cal: list[pd.Timestamp], strat_cfg: StrategyConfig, regime_cfg: RegimeConfig) -> tuple[str, pd.DataFrame, pd.Series | None]:
+    """Phase one for a single ticker: replay columns and weekly regime.
+
+    Depends only on the ticker's own bars and calendar, so tickers can be
+    computed in any process and order.
+    """
+    strategy = StrategyV15(strat_cfg)
+    catalyst = CatalystEngine(None)
+    catalyst.index_calendar(ticker, cal, daily=daily if strat_cfg.catalyst_reaction_check else None)
+    columns = ticker_columns(
+        bars_4h,
+        FeatureBuilder(strat_cfg).build_frame(bars_4h),
+        catalyst.catalyst_series(ticker, bars_4h.index),
+        strategy,
+    )
+    # the reference-mode regime is shared by all tickers and computed once by the caller
+    regime = None if regime_cfg.mode == "reference" else RegimeEngine(regime_cfg, None).compute_weekly_regime({ticker: daily})[ticker]
+    return ticker, columns, regime
+
+
+def _worker_signals(task: tuple[str, list[pd.Timestamp]]) -> tuple[str, pd.DataFrame, pd.Series]:
+    ticker, cal = task
+    w = _WORKER
+    return ticker_signals(ticker, w["bars_4h"][ticker], w["daily"].get(ticker), cal, w["strat_cfg"], w["regime_cfg"])
+
+
+class ParallelBacktester(ColumnarBacktester):
+    """Two-phase engine: per-ticker signals in a process pool, then one serial replay.
+
+    Phase one fans tickers out to worker processes that attach to the bars in
+    shared memory and return the replay columns and weekly regime per ticker.
+    Phase two merges them in bars_4h order and replays through the same
+    Portfolio / RiskEngine / SlippageModel path as ColumnarBacktester, so the
+    trades are identical to the serial engines for the same SlippageConfig.seed.
+    """
+
+    def __init__(self, *args, max_workers: int = 4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_workers = max_workers
+
+    def run(self, bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], params: BacktestParams) -> Portfolio:
+        log_kv(logger, logging.INFO, "BACKTEST_START", tickers=len(bars_4h), start=params.start, end=params.end, engine="parallel", workers=self.max_workers)
+        # calendars come from the loader (disk / memory cache) in this process
+        tasks = [(t, self.loader.get_calendar(ticker=t, start=params.start, end=params.end)) for t in bars_4h]
+
+        results: dict[str, tuple[pd.DataFrame, pd.Series]] = {}
+        if self.max_workers <= 1:
+            for t, cal in tasks:
+                _, cols, reg = ticker_signals(t, bars_4h[t], daily.get(t), cal, self.strategy.cfg, self.regime_engine.cfg)
+                results[t] = (cols, reg)
+        else:
+            shm_b, bars_layout = share_frames(bars_4h)
+            shm_d, daily_layout = share_frames(daily)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker,
+                    initargs=(bars_layout, daily_layout, self.strategy.cfg, self.regime_engine.cfg),
+                ) as ex:
+                    chunk = max(1, len(tasks) // (self.max_workers * 4))
+                    for t, cols, reg in ex.map(_worker_signals, tasks, chunksize=chunk):
+                        results[t] = (cols, reg)
+            finally:
+                for shm in (shm_b, shm_d):
+                    shm.close()
+                    shm.unlink()
+        log_kv(logger, logging.INFO, "SIGNALS_COMPUTED", tickers=len(results))
+
+        # deterministic merge: ticker order of bars_4h, not completion order
+        columns = {t: results[t][0] for t in bars_4h}
+        self.reject_reasons = reason_stats(columns.values())
+        grid = assemble_grid(columns)
+        if self.regime_engine.cfg.mode == "reference":
+            regimes = self.regime_engine.compute_weekly_regime(daily)
+        else:
+            regimes = {t: results[t][1] for t in bars_4h}
+        log_kv(logger, logging.INFO, "GRID_BUILT", rows=len(grid.index), tickers=len(grid.tickers), entries=int(grid.entry.sum()))
+        return self._replay(grid, regimes, params)
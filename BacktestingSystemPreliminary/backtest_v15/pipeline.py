@@ -0,0 +1,164 @@
+from __future__ import annotations
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable
+
+import pandas as pd
+
+from .aggregation import BarAggregator
+from .data import YFDataLoader, aggregate_1d_from_1h
+from .derived import DerivedBarCache
+from .features import FeatureBuilder
+from .logging import log_kv
+from .universe import UniverseBuilder
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopped; False if dropped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+@dataclass
+class PrepResult:
+    bars_4h: dict[str, pd.DataFrame] = field(default_factory=dict)
+    daily: dict[str, pd.DataFrame] = field(default_factory=dict)
+    features: dict[str, pd.DataFrame] = field(default_factory=dict)
+    tested: int = 0
+
+
+@dataclass
+class PrepPipeline:
+    """Bounded, streaming data prep: fetch -> 4H/daily aggregation + hygiene -> features.
+
+    Each stage runs in its own threads and hands tickers on through a bounded
+    queue, so a slow stage holds back the ones before it instead of piling up
+    frames. The 1H frame only lives between fetch and aggregation; what comes
+    out per ticker is 4H bars, daily bars and (with a FeatureBuilder) the
+    feature frame. Stops as soon as `want` tickers are accepted. With a
+    DerivedBarCache, 4H and daily bars come from the cache where possible.
+    """
+    loader: YFDataLoader
+    aggregator: BarAggregator
+    universe: UniverseBuilder
+    start: date
+    end: date
+    feats: FeatureBuilder | None = None
+    derived: DerivedBarCache | None = None
+    fetch_workers: int = 4
+    derive_workers: int = 2
+    queue_size: int = 8
+    min_4h_bars: int = 200
+
+    def _fetch(self, ticker: str):
+        d1h = self.loader.get_ohlcv(ticker, start=self.start, end=self.end, interval="1h")
+        if d1h is None or len(d1h) == 0:
+            return None
+        # warm the earnings calendar store in the same worker so the backtest never waits on it
+        self.loader.prefetch_calendar(ticker)
+        return d1h
+
+    def _derive(self, ticker: str, d1h: pd.DataFrame):
+        if self.derived is not None:
+            b4, d1 = self.derived.derive(ticker, d1h)
+        else:
+            b4, d1 = self.aggregator.to_4h_session_aware(d1h), None
+        if b4 is None or len(b4) < self.min_4h_bars:
+            return None
+        if d1 is None:
+            d1 = aggregate_1d_from_1h(d1h)
+        if d1 is None or not self.universe._passes_hygiene(ticker=ticker, oneh=d1h, daily=d1):
+            return None
+        feats = self.feats.build_frame(b4) if self.feats is not None else None
+        return b4, d1, feats
+
+    def run(self, candidates: Iterable[str], want: int) -> PrepResult:
+        stop = threading.Event()
+        q_tickers: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        q_raw: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        q_out: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        def feed():
+            for t in candidates:
+                if not _put(q_tickers, t, stop):
+                    return
+
+        def fetch():
+            while (t := _get(q_tickers, stop)) is not _DONE:
+                try:
+                    d1h = self._fetch(t)
+                except Exception as e:
+                    log_kv(logger, logging.WARN, "PREP_FAIL", ticker=t, stage="fetch", exception=e)
+                    d1h = None
+                if not _put(q_raw, (t, d1h), stop):
+                    return
+
+        def derive():
+            while (item := _get(q_raw, stop)) is not _DONE:
+                t, d1h = item
+                out = None
+                if d1h is not None:
+                    try:
+                        out = self._derive(t, d1h)
+                    except Exception as e:
+                        log_kv(logger, logging.WARN, "PREP_FAIL", ticker=t, stage="derive", exception=e)
+                # the 1H frame is not needed past this point
+                del item, d1h
+                if not _put(q_out, (t, out), stop):
+                    return
+
+        threads = []
+
+        def stage(target, n: int, name: str, q_next: queue.Queue, n_next: int) -> None:
+            """Start n threads; once all of them are done, send one _DONE per consumer of q_next."""
+            workers = [threading.Thread(target=target, name=f"prep-{name}-{i}", daemon=True) for i in range(n)]
+
+            def close():
+                for w in workers:
+                    w.join()
+                for _ in range(n_next):
+                    _put(q_next, _DONE, stop)
+
+            threads.extend(workers + [threading.Thread(target=close, name=f"prep-{name}-close", daemon=True)])
+
+        stage(feed, 1, "feed", q_tickers, self.fetch_workers)
+        stage(fetch, self.fetch_workers, "fetch", q_raw, self.derive_workers)
+        stage(derive, self.derive_workers, "derive", q_out, 1)
+        for th in threads:
+            th.start()
+
+        res = PrepResult()
+        while len(res.bars_4h) < want and (item := q_out.get()) is not _DONE:
+            t, out = item
+            res.tested += 1
+            if out is None:
+                continue
+            res.bars_4h[t], res.daily[t], feats = out
+            if feats is not None:
+                res.features[t] = feats
+
+        stop.set()
+        for th in threads:
+            th.join()
+        log_kv(logger, logging.INFO, "PREP_DONE", accepted=len(res.bars_4h), tested=res.tested, want=want)
+        return res
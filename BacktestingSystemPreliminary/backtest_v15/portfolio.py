@@ -4,6 +4,7 @@ from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 import pandas as pd
 from .logging import log_kv
+from .profiling import profiled
 logger = logging.getLogger(__name__)
 
 from .types import Position
@@ -31,14 +32,17 @@ class Portfolio:
     equity_high: float = 10000.0
     trades: List[TradeRecord] = field(default_factory=list)
 
+    @profiled("portfolio")
     def mark_equity(self) -> None:
         log_kv(logger, logging.DEBUG, "EQUITY_MARK", equity=self.equity, equity_high=self.equity_high)
         self.equity_high = max(self.equity_high, self.equity)
 
+    @profiled("portfolio")
     def open_position(self, pos: Position) -> None:
         log_kv(logger, logging.INFO, "PORTFOLIO_OPEN", ticker=pos.ticker, entry_price=pos.entry_price, size=pos.size, stop=pos.stop_close)
         self.positions[pos.ticker] = pos
 
+    @profiled("portfolio")
     def close_position(self, ticker: str, ts, exit_price: float, reason: str) -> None:
         log_kv(logger, logging.INFO, "PORTFOLIO_CLOSE", ticker=ticker, exit_price=exit_price, reason=reason)
         pos = self.positions.pop(ticker, None)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import functools
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from .logging import log_kv
+logger = logging.getLogger(__name__)
+
+# active profiler of this process; None keeps every hook down to one global lookup
+_PROFILER: "Profiler | None" = None
+
+
+class Profiler:
+    """Per-stage wall time and per-function call counts of one run.
+
+    Stage time is inclusive and attributed once per thread: a stage entered
+    again from inside itself (e.g. aggregation called by aggregation) only
+    counts calls. Prep stages run on several threads, so their totals are
+    summed thread time and can exceed the run's wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t0 = time.perf_counter()
+        self.stages: dict[str, list[float]] = {}   # name -> [calls, total_s, max_s]
+        self.calls: dict[str, int] = {}
+
+    def _active(self) -> set[str]:
+        active = getattr(self._local, "active", None)
+        if active is None:
+            active = self._local.active = set()
+        return active
+
+    def add(self, stage: str, seconds: float, func: str | None = None) -> None:
+        with self._lock:
+            s = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+            s[2] = max(s[2], seconds)
+            if func is not None:
+                self.calls[func] = self.calls.get(func, 0) + 1
+
+    def count(self, func: str, n: int = 1) -> None:
+        with self._lock:
+            self.calls[func] = self.calls.get(func, 0) + n
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "wall_s": time.perf_counter() - self._t0,
+                "stages": {k: {"calls": int(c), "total_s": t, "max_s": m} for k, (c, t, m) in sorted(self.stages.items(), key=lambda kv: -kv[1][1])},
+                "calls": dict(sorted(self.calls.items(), key=lambda kv: -kv[1])),
+            }
+
+    def write(self, path: str) -> None:
+        rep = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        log_kv(logger, logging.INFO, "PROFILE_WRITTEN", path=path, stages=len(rep["stages"]), wall_s=round(rep["wall_s"], 3))
+
+
+def start_profiling() -> Profiler:
+    global _PROFILER
+    _PROFILER = Profiler()
+    return _PROFILER
+
+
+def stop_profiling() -> Profiler | None:
+    global _PROFILER
+    p, _PROFILER = _PROFILER, None
+    return p
+
+
+class timed:
+    """Context manager timing a block as `stage` while profiling is on."""
+    __slots__ = ("stage", "func", "_p", "_t", "_outer")
+
+    def __init__(self, stage: str, func: str | None = None):
+        self.stage = stage
+        self.func = func
+
+    def __enter__(self) -> "timed":
+        self._p = p = _PROFILER
+        if p is not None:
+            active = p._active()
+            self._outer = self.stage not in active
+            if self._outer:
+                active.add(self.stage)
+                self._t = time.perf_counter()
+            elif self.func is not None:
+                p.count(self.func)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        p = self._p
+        if p is not None and self._outer:
+            p.add(self.stage, time.perf_counter() - self._t, self.func)
+            p._active().discard(self.stage)
+
+
+def profiled(stage: str) -> Callable[[Callable], Callable]:
+    """Decorator: time calls of a function as `stage` and count them under its qualified name."""
+    def deco(fn: Callable) -> Callable:
+        name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _PROFILER is None:
+                return fn(*args, **kwargs)
+            with timed(stage, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
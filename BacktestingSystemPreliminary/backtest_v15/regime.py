@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 
 from .config import RegimeConfig
 from .logging import log_kv
+from .profiling import profiled
 from .data import YFDataLoader, aggregate_1d_from_1h
 from .indicators import sma, atr
 
@@ -39,11 +41,92 @@ def classify_daily_regime(d: pd.DataFrame) -> pd.Series:
 
     return out
 
+# int8 codes of the regime labels; a bar without a known regime counts as Neutral
+REGIME_NAMES = ("Neutral", "Expansion", "Defensiv")
+REGIME_CODES = {name: np.int8(k) for k, name in enumerate(REGIME_NAMES)}
+
+
+@profiled("regime")
+def regime_codes(regime_daily: pd.Series, index: pd.DatetimeIndex) -> np.ndarray:
+    """Regime of every timestamp in index as int8 codes (see REGIME_NAMES).
+
+    Same rule as backtest.get_regime: the label at ts if present, else the last
+    non-missing label before ts, else Neutral.
+    """
+    labels = regime_daily.to_numpy(dtype=object)
+    known = pd.notna(labels)
+    codes = np.zeros(len(labels), dtype=np.int8)
+    codes[known] = [REGIME_CODES.get(str(v), 0) for v in labels[known]]
+
+    # last non-missing label at or before each daily row
+    last = np.where(known, np.arange(len(labels)), -1)
+    last = np.maximum.accumulate(last) if len(last) else last
+
+    daily_ns = pd.DatetimeIndex(regime_daily.index).as_unit("ns").asi8
+    ts_ns = pd.DatetimeIndex(index).as_unit("ns").asi8
+    pos = np.searchsorted(daily_ns, ts_ns, side="right") - 1
+    out = np.zeros(len(ts_ns), dtype=np.int8)
+    ok = pos >= 0
+    exact = ok.copy()
+    exact[ok] = daily_ns[pos[ok]] == ts_ns[ok]
+    src = np.full(len(ts_ns), -1)
+    src[ok] = last[pos[ok]]
+    # an exact match on a missing label is Neutral, not the label before it
+    src[exact & ~known[np.maximum(pos, 0)]] = -1
+    out[src >= 0] = codes[src[src >= 0]]
+    return out
+
+
+def _next_week_regime(df: pd.DataFrame, weekly: pd.Series) -> pd.Series:
+    """Weekly regimes expanded to df's daily index, each applied to the following week."""
+    daily_idx = pd.to_datetime(df.index)
+    weeks = daily_idx.to_period("W-FRI")
+    prev = weekly.reindex(weeks - 1)
+    return pd.Series(prev.to_numpy(dtype=object), index=daily_idx, dtype="object").ffill()
+
+
 @dataclass
 class RegimeEngine:
     cfg: RegimeConfig
     loader: YFDataLoader
 
+    def regime_series(self, df: pd.DataFrame) -> pd.Series:
+        """Weekly regime of one daily frame, held constant for the next week."""
+        d = df.copy()
+
+        # 3) Indicators (close-only)
+        d["SMA_F"] = sma(d["close"], self.cfg.sma_fast)
+        d["SMA_S"] = sma(d["close"], self.cfg.sma_slow)
+        d["ATR"] = atr(d, self.cfg.atr_len)
+        d["ATR_MA"] = d["ATR"].rolling(self.cfg.atr_ma_len).mean()
+
+        d["Regime_Daily"] = classify_daily_regime(d)
+
+        # 5) Weekly regime: use last close of each week (Fri)
+        d = d.dropna(subset=["Regime_Daily"])
+        d["Week"] = pd.to_datetime(d.index).to_period("W-FRI")
+        weekly = d.groupby("Week")["Regime_Daily"].last()
+
+        # 6) Expand weekly regime to daily index (applies to NEXT week)
+        return _next_week_regime(df, weekly)
+
+    def reference_daily(self, daily: dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Daily bars of cfg.ref_ticker: from the universe if present, else derived from its 1H bars."""
+        ref = daily.get(self.cfg.ref_ticker)
+        if ref is not None:
+            return ref
+        frames = [df for df in daily.values() if df is not None and len(df) > 0]
+        if self.loader is None or not frames:
+            raise RuntimeError(f"No daily data for regime reference {self.cfg.ref_ticker}.")
+        start = min(df.index[0] for df in frames).tz_localize(None).normalize() - pd.Timedelta(days=1)
+        end = max(df.index[-1] for df in frames).tz_localize(None).normalize() + pd.Timedelta(days=1)
+        oneh = self.loader.get_ohlcv(self.cfg.ref_ticker, start=start, end=end, interval="1h")
+        ref = aggregate_1d_from_1h(oneh)
+        if ref is None:
+            raise RuntimeError(f"No daily data for regime reference {self.cfg.ref_ticker}.")
+        return ref
+
+    @profiled("regime")
     def compute_weekly_regime(self, daily: dict[str, pd.DataFrame]) -> dict[str, pd.Series]:
         """
         Returns a daily-indexed Series with regime values that are held constant
@@ -53,38 +136,18 @@ class RegimeEngine:
         - 1H is the only external data source
         - Daily is derived from 1H
         - Regime computed on daily close (synthetic)
+
+        With cfg.mode == "reference" the market regime of cfg.ref_ticker is
+        computed once and the same Series is returned for every ticker.
         """
+        if self.cfg.mode == "reference":
+            ref = self.regime_series(self.reference_daily(daily))
+            log_kv(logger, logging.INFO, "REGIME_REFERENCE", ref=self.cfg.ref_ticker, tickers=len(daily))
+            return {ticker: ref for ticker in daily}
+
         regimes: dict[str, pd.Series] = {}
         for ticker, df in daily.items():
             if df is None: # or len(df) < max(self.cfg.sma_slow,self.cfg.atr_len + self.cfg.atr_ma_len,) + 10:
                 raise RuntimeError("Not enough derived daily data for regime computation.")
-
-            d = df.copy()
-
-            # 3) Indicators (close-only)
-            d["SMA_F"] = sma(d["close"], self.cfg.sma_fast)
-            d["SMA_S"] = sma(d["close"], self.cfg.sma_slow)
-            d["ATR"] = atr(d, self.cfg.atr_len)
-            d["ATR_MA"] = d["ATR"].rolling(self.cfg.atr_ma_len).mean()
-
-            d["Regime_Daily"] = classify_daily_regime(d)
-
-            # 5) Weekly regime: use last close of each week (Fri)
-            d = d.dropna(subset=["Regime_Daily"])
-            d["Week"] = pd.to_datetime(d.index).to_period("W-FRI")
-            weekly = d.groupby("Week")["Regime_Daily"].last()
-
-            # 6) Expand weekly regime to daily index (applies to NEXT week)
-            daily_idx = pd.to_datetime(df.index)
-            out = pd.Series(index=daily_idx, dtype="object")
-
-            weeks = daily_idx.to_period("W-FRI")
-            for w in weeks.unique():
-                reg = weekly.get(w, None)
-                next_w = w + 1
-                mask = weeks == next_w
-                if reg is not None:
-                    out.loc[mask] = reg
-
-            regimes[ticker] = out.ffill()
+            regimes[ticker] = self.regime_series(df)
         return regimes
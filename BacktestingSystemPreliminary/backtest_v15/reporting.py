@@ -21,7 +21,29 @@ def portfolio_to_frames(p: Portfolio):
         equity = pd.DataFrame({"timestamp": trades["exit_ts"].values, "equity": equity_vals.values})
     return trades, equity
 
-def save_run(run_dir: str, portfolio: Portfolio, params: dict):
+def summarize(p: Portfolio, initial_equity: float) -> dict:
+    """One summary row for a run (used by parameter sweeps)."""
+    pnl = [t.pnl for t in p.trades]
+    r = [t.r_multiple for t in p.trades]
+    wins = [x for x in pnl if x > 0]
+    losses = [x for x in pnl if x < 0]
+    # realised equity path in close order
+    peak, max_dd, eq = initial_equity, 0.0, initial_equity
+    for x in pnl:
+        eq += x
+        peak = max(peak, eq)
+        max_dd = max(max_dd, (peak - eq) / peak if peak > 0 else 0.0)
+    return {
+        "trades": len(pnl),
+        "final_equity": float(p.equity),
+        "total_return": float(p.equity / initial_equity - 1.0) if initial_equity else 0.0,
+        "win_rate": len(wins) / len(pnl) if pnl else 0.0,
+        "avg_r": sum(r) / len(r) if r else 0.0,
+        "profit_factor": (sum(wins) / -sum(losses)) if losses else None,
+        "max_drawdown": float(max_dd),
+    }
+
+def save_run(run_dir: str, portfolio: Portfolio, params: dict, reject_reasons: pd.Series | None = None):
     log_kv(logger, logging.INFO, "REPORT_SAVE_START", run_dir=run_dir, trades=len(portfolio.trades))
     os.makedirs(run_dir, exist_ok=True)
     log_kv(logger, logging.DEBUG, "REPORT_DIR_READY", run_dir=run_dir)
@@ -30,3 +52,8 @@ def save_run(run_dir: str, portfolio: Portfolio, params: dict):
     equity.to_csv(os.path.join(run_dir, "equity.csv"), index=False)
     with open(os.path.join(run_dir, "params.json"), "w", encoding="utf-8") as f:
         json.dump(params, f, indent=2, default=str)
+    summary = summarize(portfolio, params.get("initial_equity", 0.0))
+    if reject_reasons is not None:
+        summary["reject_reasons"] = {tag: int(n) for tag, n in reject_reasons.items()}
+    with open(os.path.join(run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow.ipc as ipc
+
+from .download import RateLimited
+from .logging import log_kv
+from .profiling import profiled
+logger = logging.getLogger(__name__)
+
+_OHLCV = ["open", "high", "low", "close", "volume"]
+_ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+
+@dataclass
+class ServiceFetcher:
+    """OhlcvFetcher reading bars from the MarketDataLoader service (GET /api/v1/prices).
+
+    One HTTP request per fetch_many() batch, answered as an Arrow IPC stream.
+    Plugged into YFDataLoader it replaces the yfinance downloads and keeps the
+    disk store, so many processes share bars that were downloaded once by the
+    service. The service only knows the bars it stored (see its batch update
+    endpoint) and cannot tell "no bars" from "not loaded yet", so a ticker
+    without bars in the window comes back as None: the range stays missing in
+    the store and is asked for again on the next run.
+    """
+    base_url: str
+    tz: str = "America/New_York"  # bars are returned in this timezone, like yfinance
+    timeout_s: float = 60.0
+
+    def _bound(self, ts: pd.Timestamp) -> str:
+        ts = pd.Timestamp(ts)
+        return (ts.tz_localize(self.tz) if ts.tz is None else ts).isoformat()
+
+    @profiled("download")
+    def _get(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame]:
+        query = urllib.parse.urlencode({
+            "symbols": ",".join(tickers), "start": self._bound(start), "end": self._bound(end),
+            "interval": interval, "format": "arrow",
+        })
+        req = urllib.request.Request(f"{self.base_url.rstrip('/')}/api/v1/prices?{query}", headers={"Accept": _ARROW_STREAM})
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+            table = ipc.open_stream(resp).read_all()
+
+        df = table.to_pandas()
+        df = df.set_index(pd.DatetimeIndex(df.pop("timestamp"), name="datetime").tz_convert(self.tz))
+        return {symbol: part[_OHLCV] for symbol, part in df.groupby("symbol", sort=False)}
+
+    def fetch(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame | None:
+        try:
+            return self.fetch_many([ticker], start, end, interval)[ticker]
+        except RateLimited as e:
+            log_kv(logger, logging.WARNING, "DATA_DOWNLOAD_FAIL", ticker=ticker, interval=interval, err=str(e))
+            return None
+
+    def fetch_many(self, tickers: list[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict[str, pd.DataFrame | None]:
+        try:
+            got = self._get(list(tickers), start, end, interval)
+        except urllib.error.HTTPError as e:
+            if e.code in (429, 503):
+                raise RateLimited(f"service answered {e.code}") from e
+            log_kv(logger, logging.WARNING, "DATA_DOWNLOAD_FAIL", tickers=len(tickers), interval=interval, err=str(e))
+            return {t: None for t in tickers}
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "DATA_DOWNLOAD_FAIL", tickers=len(tickers), interval=interval, err=str(e))
+            return {t: None for t in tickers}
+        # the service upper-cases symbols
+        return {t: got.get(t.strip().upper()) for t in tickers}
@@ -0,0 +1,65 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .logging import log_kv
+logger = logging.getLogger(__name__)
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+@dataclass(frozen=True)
+class SharedFrames:
+    """Layout of many OHLCV frames packed into one shared-memory block.
+
+    The block holds every timestamp (int64, UTC ns) followed by a rows x 5
+    float64 matrix of open/high/low/close/volume. Frame k spans rows
+    offsets[k]:offsets[k+1].
+    """
+    name: str
+    keys: tuple[str, ...]
+    offsets: tuple[int, ...]
+    tz: tuple[str | None, ...]
+    index_name: tuple[str | None, ...]
+
+
+def share_frames(frames: dict[str, pd.DataFrame]) -> tuple[shared_memory.SharedMemory, SharedFrames]:
+    keys = tuple(frames)
+    offsets = np.r_[0, np.cumsum([len(frames[k]) for k in keys])].astype(np.int64)
+    rows = int(offsets[-1])
+    shm = shared_memory.SharedMemory(create=True, size=max(rows * 8 * (1 + len(OHLCV)), 1))
+    ts = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((rows, len(OHLCV)), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+    tz, names = [], []
+    for k, a, b in zip(keys, offsets[:-1], offsets[1:]):
+        df = frames[k]
+        idx = pd.DatetimeIndex(df.index)
+        tz.append(None if idx.tz is None else str(idx.tz))
+        names.append(idx.name)
+        ts[a:b] = (idx.tz_convert("UTC") if idx.tz is not None else idx).as_unit("ns").asi8
+        values[a:b] = df.loc[:, list(OHLCV)].to_numpy(dtype=np.float64)
+    layout = SharedFrames(shm.name, keys, tuple(int(o) for o in offsets), tuple(tz), tuple(names))
+    log_kv(logger, logging.DEBUG, "SHM_FRAMES_SHARED", name=shm.name, frames=len(keys), rows=rows)
+    return shm, layout
+
+
+def attach_frames(layout: SharedFrames) -> tuple[shared_memory.SharedMemory, dict[str, pd.DataFrame]]:
+    """Zero-copy DataFrames over a block written by share_frames (keep the shm alive)."""
+    # pool workers share the parent's resource tracker, so attaching does not
+    # hand ownership over; the creating process unlinks the block
+    shm = shared_memory.SharedMemory(name=layout.name)
+    rows = layout.offsets[-1]
+    ts = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((rows, len(OHLCV)), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+    frames = {}
+    for k, a, b, tz, name in zip(layout.keys, layout.offsets[:-1], layout.offsets[1:], layout.tz, layout.index_name):
+        idx = pd.DatetimeIndex(ts[a:b].view("datetime64[ns]"))
+        if tz is not None:
+            idx = idx.tz_localize("UTC").tz_convert(tz)
+        idx.name = name
+        frames[k] = pd.DataFrame(values[a:b], index=idx, columns=list(OHLCV), copy=False)
+    return shm, frames
@@ -0,0 +1,267 @@
+from __future__ import annotations
+import glob
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .logging import log_kv
+from .profiling import profiled
+logger = logging.getLogger(__name__)
+
+# covered ranges in the parquet metadata of the earlier one-file-per-ticker layout
+_RANGES_KEY = b"backtest_v15.ranges"
+_MANIFEST = "manifest.json"
+# ~1 year of 1h bars per row group: the unit a windowed read skips or decodes
+_ROW_GROUP_ROWS = 2048
+
+Range = tuple[pd.Timestamp, pd.Timestamp]
+
+
+def safe_name(ticker: str) -> str:
+    return re.sub(r"[^A-Za-z0-9\-_\.]+", "_", ticker)
+
+
+def merge_ranges(ranges: list[Range]) -> list[Range]:
+    """Union of half-open [start, end) ranges, sorted, overlapping/adjacent ones joined."""
+    out: list[Range] = []
+    for s, e in sorted(ranges):
+        if s >= e:
+            continue
+        if out and s <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], e))
+        else:
+            out.append((s, e))
+    return out
+
+
+def subtract_ranges(start: pd.Timestamp, end: pd.Timestamp, covered: list[Range]) -> list[Range]:
+    """Parts of [start, end) not covered by the (merged) ranges."""
+    gaps: list[Range] = []
+    cur = start
+    for s, e in covered:
+        if e <= cur:
+            continue
+        if s >= end:
+            break
+        if s > cur:
+            gaps.append((cur, min(s, end)))
+        cur = max(cur, e)
+        if cur >= end:
+            break
+    if cur < end:
+        gaps.append((cur, end))
+    return gaps
+
+
+def window_frame(df: pd.DataFrame, start: pd.Timestamp | None, end: pd.Timestamp | None) -> pd.DataFrame:
+    """Rows with start <= ts < end, dates taken in the index's own timezone."""
+    idx = df.index
+    mask = np.ones(len(idx), dtype=bool)
+    if start is not None:
+        s = start.tz_localize(idx.tz) if idx.tz is not None else start
+        mask &= idx >= s
+    if end is not None:
+        e = end.tz_localize(idx.tz) if idx.tz is not None else end
+        mask &= idx < e
+    return df[mask]
+
+
+def _part_name() -> str:
+    return f"part-{time.time_ns():x}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def _window_filters(schema: pa.Schema, start: pd.Timestamp | None, end: pd.Timestamp | None) -> list | None:
+    """Parquet filters for start <= ts < end on the (first) timestamp column, in its own timezone."""
+    col = next((f for f in schema if pa.types.is_timestamp(f.type)), None)
+    if col is None:
+        return None
+    filters = []
+    for bound, op in ((start, ">="), (end, "<")):
+        if bound is None:
+            continue
+        ts = pd.Timestamp(bound)
+        if col.type.tz is not None:
+            ts = ts.tz_localize(col.type.tz) if ts.tz is None else ts.tz_convert(col.type.tz)
+        elif ts.tz is not None:
+            ts = ts.tz_localize(None)
+        filters.append((col.name, op, ts))
+    return filters or None
+
+
+class OhlcvStore:
+    """Append-only parquet parts per ticker and interval, plus the date ranges they cover.
+
+    Layout: <root>/<interval>/<ticker>/part-*.parquet and a manifest.json that
+    lists the parts (oldest first) and the covered [start, end) date ranges,
+    so nothing is scanned on startup and a read only opens the files it needs.
+    A write adds the new bars as one more part and replaces the manifest; once
+    a ticker has more than max_parts parts they are compacted into one.
+    Timestamps are deduplicated on read (the newest part wins), and reads push
+    the window down to parquet as a filter on the timestamp column, so only the
+    row groups overlapping the window are decoded.
+    """
+
+    def __init__(self, root: str, max_parts: int = 8):
+        self.root = root
+        self.max_parts = max_parts
+        self._lock = Lock()
+        self._ticker_locks: dict[tuple[str, str], Lock] = {}
+        self._manifests: dict[tuple[str, str], dict] = {}
+
+    def path(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.root, interval, safe_name(ticker))
+
+    def _key_lock(self, key: tuple[str, str]) -> Lock:
+        with self._lock:
+            return self._ticker_locks.setdefault(key, Lock())
+
+    def _load_manifest(self, ticker: str, interval: str) -> dict:
+        """Manifest from disk; a single file of the earlier one-file-per-ticker layout becomes the first part."""
+        d = self.path(ticker, interval)
+        path = os.path.join(d, _MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                raw = json.load(f)
+            return {"parts": list(raw["parts"]), "ranges": merge_ranges([(pd.Timestamp(s), pd.Timestamp(e)) for s, e in raw["ranges"]])}
+        old = d + ".parquet"
+        if not os.path.exists(old):
+            return {"parts": [], "ranges": []}
+        meta = pq.read_schema(old).metadata or {}
+        ranges = merge_ranges([(pd.Timestamp(s), pd.Timestamp(e)) for s, e in json.loads(meta.get(_RANGES_KEY, b"[]"))])
+        os.makedirs(d, exist_ok=True)
+        part = _part_name()
+        os.replace(old, os.path.join(d, part))
+        manifest = {"parts": [part], "ranges": ranges}
+        self._save_manifest(ticker, interval, manifest)
+        log_kv(logger, logging.INFO, "STORE_LAYOUT_UPGRADED", ticker=ticker, interval=interval)
+        return manifest
+
+    def _save_manifest(self, ticker: str, interval: str, manifest: dict) -> None:
+        path = os.path.join(self.path(ticker, interval), _MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"parts": manifest["parts"], "ranges": [[s.isoformat(), e.isoformat()] for s, e in manifest["ranges"]]}, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self._manifests[(ticker, interval)] = manifest
+
+    def _manifest(self, ticker: str, interval: str) -> dict:
+        key = (ticker, interval)
+        with self._lock:
+            manifest = self._manifests.get(key)
+        if manifest is not None:
+            return manifest
+        try:
+            with self._key_lock(key):
+                manifest = self._load_manifest(ticker, interval)
+        except Exception as e:
+            log_kv(logger, logging.WARNING, "STORE_META_READ_FAIL", ticker=ticker, interval=interval, err=str(e))
+            manifest = {"parts": [], "ranges": []}
+        with self._lock:
+            self._manifests[key] = manifest
+        return manifest
+
+    def covered(self, ticker: str, interval: str) -> list[Range]:
+        return list(self._manifest(ticker, interval)["ranges"])
+
+    def missing(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> list[Range]:
+        return subtract_ranges(start, end, self.covered(ticker, interval))
+
+    def _read_parts(self, d: str, parts: list[str], start: pd.Timestamp | None, end: pd.Timestamp | None) -> pd.DataFrame | None:
+        frames = []
+        for part in parts:
+            path = os.path.join(d, part)
+            pf = pq.ParquetFile(path)
+            filters = _window_filters(pf.schema_arrow, start, end)
+            frames.append(pq.read_table(path, filters=filters).to_pandas() if filters else pf.read().to_pandas())
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return None
+        tz = frames[-1].index.tz
+        if tz is not None:
+            for f in frames:
+                if f.index.tz is not None and f.index.tz != tz:
+                    f.index = f.index.tz_convert(tz)
+        df = pd.concat(frames) if len(frames) > 1 else frames[0]
+        if len(frames) > 1:
+            df = df[~df.index.duplicated(keep="last")].sort_index()
+        return df
+
+    @profiled("cache_read")
+    def read(self, ticker: str, interval: str, start: pd.Timestamp | None = None, end: pd.Timestamp | None = None) -> pd.DataFrame | None:
+        parts = self._manifest(ticker, interval)["parts"]
+        if not parts:
+            return None
+        with self._key_lock((ticker, interval)):
+            df = self._read_parts(self.path(ticker, interval), parts, start, end)
+        if df is None:
+            return None
+        return window_frame(df, start, end)
+
+    def write(self, ticker: str, interval: str, df: pd.DataFrame | None, ranges: list[Range]) -> None:
+        """Append df as a new part and mark the [start, end) ranges as covered."""
+        key = (ticker, interval)
+        d = self.path(ticker, interval)
+        with self._key_lock(key):
+            # reread the manifest: another process may have added parts since we cached it
+            manifest = self._load_manifest(ticker, interval)
+            with self._lock:
+                cached = self._manifests.get(key)
+            ranges = merge_ranges(manifest["ranges"] + (cached["ranges"] if cached else []) + list(ranges))
+            parts = list(manifest["parts"])
+            rows = 0
+            if df is not None and len(df):
+                df = df[~df.index.duplicated(keep="last")].sort_index()
+                parts.append(self._write_part(d, df))
+                rows = len(df)
+            elif not parts:
+                return
+            old_parts = []
+            if len(parts) > self.max_parts:
+                old_parts = parts
+                parts = [self._write_part(d, self._read_parts(d, old_parts, None, None))]
+            self._save_manifest(ticker, interval, {"parts": parts, "ranges": ranges})
+            for part in old_parts:
+                try:
+                    os.remove(os.path.join(d, part))
+                except OSError:
+                    pass
+        log_kv(logger, logging.DEBUG, "STORE_WRITE", ticker=ticker, interval=interval, rows=rows, parts=len(parts),
+               compacted=bool(old_parts), ranges=len(ranges))
+
+    @staticmethod
+    def _write_part(d: str, df: pd.DataFrame) -> str:
+        os.makedirs(d, exist_ok=True)
+        part = _part_name()
+        path = os.path.join(d, part)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=True), path + ".tmp", row_group_size=_ROW_GROUP_ROWS)
+        os.replace(path + ".tmp", path)
+        return part
+
+    def import_legacy(self, legacy_dir: str, ticker: str, interval: str) -> int:
+        """Fold files of the old `ticker__interval__start__end.parquet` cache into the store."""
+        pattern = os.path.join(glob.escape(legacy_dir), f"{glob.escape(safe_name(ticker))}__{glob.escape(interval)}__*__*.parquet")
+        n = 0
+        for fn in sorted(glob.glob(pattern)):
+            parts = os.path.basename(fn)[: -len(".parquet")].split("__")
+            try:
+                start, end = pd.Timestamp(parts[2]), pd.Timestamp(parts[3])
+                df = pd.read_parquet(fn)
+            except Exception as e:
+                log_kv(logger, logging.WARNING, "STORE_LEGACY_SKIP", path=fn, err=str(e))
+                continue
+            if len(df):
+                self.write(ticker, interval, df, [(start, end)])
+                n += 1
+        if n:
+            log_kv(logger, logging.INFO, "STORE_LEGACY_IMPORTED", ticker=ticker, interval=interval, files=n)
+        return n
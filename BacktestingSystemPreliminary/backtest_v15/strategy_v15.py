@@ -1,9 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Iterable, Tuple
+import numpy as np
 import pandas as pd
 import logging
 from .logging import log_kv
+from .profiling import profiled
 
 logger = logging.getLogger(__name__)
 
@@ -13,23 +15,53 @@ from .types import Signal, SignalType
 from .features import FeatureSnapshot
 from .catalyst import CatalystInfo
 
+# Map internal reason tags to stable debug reason codes
+REASON_MAP = {
+    "NO_TREND_HHHL": "FAIL_TREND_STRUCTURE",
+    "VOL_FILTER_FAIL": "FAIL_ATR_CONTRACTION",
+    "NO_CATALYST": "FAIL_NO_CATALYST",
+    "PULLBACK_TOO_SHORT": "FAIL_PULLBACK_TOO_SHORT",
+    "PULLBACK_TOO_DEEP": "FAIL_PULLBACK_TOO_DEEP",
+    "PULLBACK_VOL_NOT_LOWER": "FAIL_PULLBACK_VOLUME",
+    "TRIGGER_NOT_MET": "FAIL_TRIGGER_CLOSE",
+}
+
+# Bit per entry reject reason, in the order evaluate() checks them
+REASON_BITS = {
+    tag: 1 << k
+    for k, tag in enumerate((
+        "DATA_TOO_SHORT",
+        "NO_TREND_HHHL",
+        "VOL_FILTER_FAIL",
+        "NO_CATALYST",
+        "NO_PULLBACK",
+        "PULLBACK_TOO_SHORT",
+        "PULLBACK_TOO_DEEP",
+        "NO_LAST_HL",
+        "CLOSE_BELOW_LAST_HL",
+        "VOLUME_METRICS_MISSING",
+        "PULLBACK_VOL_NOT_LOWER",
+        "TRIGGER_NOT_MET",
+    ))
+}
+
+def reason_stats(frames: Iterable[pd.DataFrame]) -> pd.Series:
+    """Number of rejected bars per reason tag over the "reasons" columns of evaluate_frame() results
+    (a bar can count for several)."""
+    counts = dict.fromkeys(REASON_BITS, 0)
+    for frame in frames:
+        masks = frame["reasons"].to_numpy(dtype=np.int64)
+        for tag, bit in REASON_BITS.items():
+            counts[tag] += int(np.count_nonzero(masks & bit))
+    return pd.Series(counts, name="bars")
+
 @dataclass
 class StrategyV15:
     cfg: StrategyConfig
 
+    @profiled("strategy")
     def evaluate(self, bars_4h: pd.DataFrame, idx: int, feat: FeatureSnapshot, cat: CatalystInfo, in_position: bool) -> Signal:
         reasons = []
-        # Map internal reason tags to stable debug reason codes
-        REASON_MAP = {
-            "NO_TREND_HHHL": "FAIL_TREND_STRUCTURE",
-            "VOL_FILTER_FAIL": "FAIL_ATR_CONTRACTION",
-            "NO_CATALYST": "FAIL_NO_CATALYST",
-            "PULLBACK_TOO_SHORT": "FAIL_PULLBACK_TOO_SHORT",
-            "PULLBACK_TOO_DEEP": "FAIL_PULLBACK_TOO_DEEP",
-            "PULLBACK_VOL_NOT_LOWER": "FAIL_PULLBACK_VOLUME",
-            "TRIGGER_NOT_MET": "FAIL_TRIGGER_CLOSE",
-        }
-
 
         bar_ts = bars_4h.index[idx] if bars_4h is not None and len(bars_4h) > idx else None
         # Not enough data safety
@@ -88,3 +120,59 @@ class StrategyV15:
             if not feat.hh_hl:
                 return Signal(SignalType.EXIT, ("TREND_BREAK",), {})
             return Signal(SignalType.NONE, (), {})
+
+    @profiled("strategy")
+    def evaluate_frame(self, bars_4h: pd.DataFrame, feature_frame: pd.DataFrame, catalysts: pd.DataFrame | None = None) -> pd.DataFrame:
+        """Vectorized evaluate() for every bar of one ticker.
+
+        feature_frame comes from FeatureBuilder.build_frame, catalysts from
+        CatalystEngine.catalyst_series (None = no catalyst anywhere). Returns
+        entry (evaluate(in_position=False) is ENTRY), exit (evaluate(in_position=True)
+        is EXIT) and reasons, the entry reject reasons as a REASON_BITS mask.
+        NaN stands in for None, so comparisons on missing features fail as there.
+        """
+        n = len(bars_4h)
+        close = bars_4h["close"].to_numpy(dtype=float)
+        high_prev = bars_4h["high"].shift(1).to_numpy(dtype=float)
+        if catalysts is None:
+            has_cat = np.zeros(n, dtype=bool)
+        else:
+            has_cat = catalysts["has_catalyst"].to_numpy(dtype=bool)
+        f = {c: feature_frame[c].to_numpy(dtype=float) for c in (
+            "atr", "atr_ma", "range5", "range20", "last_hl_close", "pullback_bars",
+            "pullback_retrace", "vol_pullback_avg", "vol_impulse_avg")}
+        hh_hl = feature_frame["hh_hl"].to_numpy(dtype=bool)
+        short = np.arange(n) < 5
+
+        def bit(tag, cond):
+            return np.where(cond, REASON_BITS[tag], 0)
+
+        with np.errstate(invalid="ignore"):
+            vol_ok = (f["atr"] > f["atr_ma"]) | ((f["range20"] > 0) & (f["range5"] >= 1.3 * f["range20"])) | has_cat
+            pb, retrace = f["pullback_bars"], f["pullback_retrace"]
+            no_pb = np.isnan(pb)
+            pb_short = ~no_pb & (pb < self.cfg.pullback_min_bars)
+            pb_deep = ~no_pb & ~pb_short & ~(retrace <= self.cfg.pullback_max_retrace)
+            no_hl = np.isnan(f["last_hl_close"])
+            vol_missing = np.isnan(f["vol_pullback_avg"]) | np.isnan(f["vol_impulse_avg"])
+
+            reasons = (
+                bit("NO_TREND_HHHL", ~hh_hl)
+                | bit("VOL_FILTER_FAIL", ~vol_ok)
+                | bit("NO_CATALYST", ~has_cat & bool(self.cfg.require_catalyst))
+                | bit("NO_PULLBACK", no_pb)
+                | bit("PULLBACK_TOO_SHORT", pb_short)
+                | bit("PULLBACK_TOO_DEEP", pb_deep)
+                | bit("NO_LAST_HL", no_hl)
+                | bit("CLOSE_BELOW_LAST_HL", ~no_hl & (close < f["last_hl_close"]))
+                | bit("VOLUME_METRICS_MISSING", vol_missing)
+                | bit("PULLBACK_VOL_NOT_LOWER", ~vol_missing & (f["vol_pullback_avg"] > f["vol_impulse_avg"]))
+                | bit("TRIGGER_NOT_MET", ~(close > high_prev))
+            )
+        reasons = np.where(short, REASON_BITS["DATA_TOO_SHORT"], reasons).astype(np.int64)
+
+        return pd.DataFrame({
+            "entry": reasons == 0,
+            "exit": ~short & ~hh_hl,
+            "reasons": reasons,
+        }, index=bars_4h.index)
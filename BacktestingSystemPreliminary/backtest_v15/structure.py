@@ -1,5 +1,7 @@
 from __future__ import annotations
 import logging
+import math
+from collections import deque
 from dataclasses import dataclass
 import pandas as pd
 from .logging import log_kv
@@ -35,9 +37,10 @@ def last_two_values(series: pd.Series, mask: pd.Series) -> tuple[float|None, flo
         return None, None
     return float(pts.iloc[-2]), float(pts.iloc[-1])
 
-def is_hh_hl(close: pd.Series, left: int = 2, right: int = 2) -> bool:
+def is_hh_hl(close: pd.Series, left: int = 2, right: int = 2, swings: SwingPoints | None = None) -> bool:
     log_kv(logger, logging.DEBUG, "STRUCT_HHHL_CHECK", rows=len(close))
-    swings = detect_swings_close_only(close, left, right)
+    if swings is None:
+        swings = detect_swings_close_only(close, left, right)
     hi2 = close[swings.swing_high]
     lo2 = close[swings.swing_low]
     if len(hi2) < 2 or len(lo2) < 2:
@@ -45,9 +48,71 @@ def is_hh_hl(close: pd.Series, left: int = 2, right: int = 2) -> bool:
     # last two highs and lows must be higher
     return (hi2.iloc[-1] > hi2.iloc[-2]) and (lo2.iloc[-1] > lo2.iloc[-2])
 
-def last_higher_low_close(close: pd.Series, left: int = 2, right: int = 2) -> float|None:
-    swings = detect_swings_close_only(close, left, right)
+def last_higher_low_close(close: pd.Series, left: int = 2, right: int = 2, swings: SwingPoints | None = None) -> float|None:
+    if swings is None:
+        swings = detect_swings_close_only(close, left, right)
     lows = close[swings.swing_low]
     if len(lows) == 0:
         return None
     return float(lows.iloc[-1])
+
+class SwingTracker:
+    """Streaming close-only pivot detector, O(1) per bar.
+
+    Feed closes one at a time with update(). A pivot at bar t is confirmed on
+    bar t + right, once its window [t-left, t+right] is complete, so the state
+    after bar i matches detect_swings_close_only() on close[:i+1].
+    """
+
+    def __init__(self, left: int = 2, right: int = 2):
+        self.left = left
+        self.right = right
+        self.bar = -1
+        self._window: deque[float] = deque(maxlen=left + right + 1)
+        # (bar, close) of the last two confirmed pivots, oldest first
+        self.highs: deque[tuple[int, float]] = deque(maxlen=2)
+        self.lows: deque[tuple[int, float]] = deque(maxlen=2)
+
+    def update(self, close: float) -> tuple[bool, bool]:
+        """Consume the next close; returns (high_confirmed, low_confirmed) on this bar."""
+        self.bar += 1
+        self._window.append(float(close))
+        if len(self._window) < self._window.maxlen:
+            return False, False
+        if any(math.isnan(v) for v in self._window):
+            return False, False
+        c = self._window[self.left]
+        pivot = self.bar - self.right
+        new_high = c == max(self._window)
+        new_low = c == min(self._window)
+        if new_high:
+            self.highs.append((pivot, c))
+        if new_low:
+            self.lows.append((pivot, c))
+        return new_high, new_low
+
+    @property
+    def hh_hl(self) -> bool:
+        if len(self.highs) < 2 or len(self.lows) < 2:
+            return False
+        return self.highs[1][1] > self.highs[0][1] and self.lows[1][1] > self.lows[0][1]
+
+    @property
+    def last_hl_close(self) -> float | None:
+        return self.lows[-1][1] if self.lows else None
+
+    @property
+    def last_high_bar(self) -> int | None:
+        return self.highs[-1][0] if self.highs else None
+
+    @property
+    def last_low_bar(self) -> int | None:
+        return self.lows[-1][0] if self.lows else None
+
+    @property
+    def pullback_bars(self) -> int:
+        """Bars since the last swing high, if it follows the last swing low (else 0)."""
+        lo, hi = self.last_low_bar, self.last_high_bar
+        if lo is None or hi is None or lo >= hi:
+            return 0
+        return self.bar - hi
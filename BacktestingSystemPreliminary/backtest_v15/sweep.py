@@ -0,0 +1,147 @@
+from __future__ import annotations
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields, replace
+from typing import Any
+
+import pandas as pd
+
+from .backtest import Backtester, BacktestParams
+from .columnar import ColumnarBacktester
+from .config import AggregationConfig, RegimeConfig, RiskConfig, SlippageConfig, StrategyConfig
+from .logging import log_kv
+from .regime import RegimeEngine
+from .reporting import summarize
+from .shared import SharedFrames, attach_frames, share_frames
+logger = logging.getLogger(__name__)
+
+# sweepable config sections; field names are unique across them
+SECTIONS = {"strategy": StrategyConfig, "risk": RiskConfig, "slippage": SlippageConfig}
+
+ENGINES = {"loop": Backtester, "columnar": ColumnarBacktester}
+
+
+def _parse_value(raw: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "y")
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    return raw
+
+
+def parse_param(spec: str) -> tuple[str, str, list]:
+    """'pullback_max_retrace=0.4,0.5' -> ('strategy', 'pullback_max_retrace', [0.4, 0.5])."""
+    name, _, raw = spec.partition("=")
+    name = name.strip()
+    for section, cls in SECTIONS.items():
+        for f in fields(cls):
+            if f.name == name:
+                return section, name, [_parse_value(v, f.default) for v in raw.split(",") if v.strip()]
+    raise ValueError(f"Unknown sweep parameter: {name}")
+
+
+def expand_grid(specs: list[str]) -> list[dict[str, dict[str, Any]]]:
+    """Cartesian product of --param specs as {section: {field: value}} overrides."""
+    axes = [parse_param(s) for s in specs]
+    combos = []
+    for values in itertools.product(*[vals for _, _, vals in axes]):
+        combo = {section: {} for section in SECTIONS}
+        for (section, name, _), v in zip(axes, values):
+            combo[section][name] = v
+        combos.append(combo)
+    return combos
+
+
+@dataclass(frozen=True)
+class SweepBase:
+    """Configs shared by every combination; data access goes through the loader passed to run_sweep."""
+    aggregation: AggregationConfig
+    strategy: StrategyConfig
+    risk: RiskConfig
+    slippage: SlippageConfig
+    regime: RegimeConfig
+    engine: str = "columnar"
+
+
+@dataclass
+class ResolvedCalendars:
+    """Loader stand-in for sweep workers: the earnings calendars the parent's loader resolved."""
+    calendars: dict[str, list[pd.Timestamp]]
+
+    def get_calendar(self, ticker: str, start, end) -> list[pd.Timestamp]:
+        return self.calendars.get(ticker, [])
+
+
+# per-process state of a sweep worker (attached frames, resolved inputs, input memo)
+_WORKER: dict[str, Any] = {}
+
+
+def _init_worker(bars_layout: SharedFrames, daily_layout: SharedFrames, base: SweepBase, params: BacktestParams,
+                 calendars: dict[str, list[pd.Timestamp]], regimes: dict[str, pd.Series]) -> None:
+    shm_b, bars_4h = attach_frames(bars_layout)
+    shm_d, daily = attach_frames(daily_layout)
+    _WORKER.update(
+        shm=(shm_b, shm_d), bars_4h=bars_4h, daily=daily, base=base, params=params,
+        loader=ResolvedCalendars(calendars), cache={("regime", base.regime): regimes},
+    )
+
+
+def _run_combo(task: tuple[int, dict]) -> dict:
+    k, combo = task
+    w = _WORKER
+    base: SweepBase = w["base"]
+    bt = ENGINES[base.engine](
+        w["loader"],
+        base.aggregation,
+        replace(base.strategy, **combo["strategy"]),
+        replace(base.slippage, **combo["slippage"]),
+        replace(base.risk, **combo["risk"]),
+        base.regime,
+    )
+    # regimes, features and catalysts are reused between combos that share their inputs
+    bt.input_cache = w["cache"]
+    pf = bt.run(bars_4h=w["bars_4h"], daily=w["daily"], params=w["params"])
+    row = {"combo": k}
+    for section in SECTIONS:
+        row.update({f"{section}.{n}": v for n, v in combo[section].items()})
+    row.update(summarize(pf, w["params"].initial_equity))
+    return row
+
+
+def run_sweep(bars_4h: dict[str, pd.DataFrame], daily: dict[str, pd.DataFrame], combos: list[dict], base: SweepBase, params: BacktestParams, loader, max_workers: int = 1) -> pd.DataFrame:
+    """Backtest every combo on the same prepared bars; one summary row per combo.
+
+    Everything the engines would ask the loader for (earnings calendars and the
+    weekly regime, incl. the reference ticker's bars) is resolved once here with
+    the run's own loader, so workers use the same data source and never download.
+    """
+    log_kv(logger, logging.INFO, "SWEEP_START", combos=len(combos), tickers=len(bars_4h), workers=max_workers)
+    tasks = list(enumerate(combos))
+    calendars = {t: loader.get_calendar(ticker=t, start=params.start, end=params.end) for t in bars_4h}
+    regimes = RegimeEngine(base.regime, loader).compute_weekly_regime(daily=daily)
+
+    if max_workers <= 1:
+        _WORKER.update(bars_4h=bars_4h, daily=daily, base=base, params=params,
+                       loader=ResolvedCalendars(calendars), cache={("regime", base.regime): regimes})
+        rows = [_run_combo(t) for t in tasks]
+    else:
+        shm_b, bars_layout = share_frames(bars_4h)
+        shm_d, daily_layout = share_frames(daily)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(bars_layout, daily_layout, base, params, calendars, regimes),
+            ) as ex:
+                rows = list(ex.map(_run_combo, tasks))
+        finally:
+            for shm in (shm_b, shm_d):
+                shm.close()
+                shm.unlink()
+
+    out = pd.DataFrame(rows).sort_values("combo").reset_index(drop=True)
+    log_kv(logger, logging.INFO, "SWEEP_DONE", combos=len(out))
+    return out
@@ -0,0 +1,215 @@
+"""Benchmarks of the hot paths on synthetic data.
+
+    python -m benchmarks.bench --scale 10x250 --scale 50x500 --repeat 3
+
+Each scale is TICKERSxDAYS of synthetic 1H bars. Results (best time of
+--repeat runs, throughput in bars/sec, tracemalloc peak) are written as JSON
+to benchmarks/results/ so runs can be compared across commits.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from backtest_v15.aggregation import BarAggregator
+from backtest_v15.backtest import Backtester, BacktestParams
+from backtest_v15.catalyst import CatalystEngine
+from backtest_v15.columnar import ColumnarBacktester
+from backtest_v15.config import AggregationConfig, RegimeConfig, RiskConfig, SlippageConfig, StrategyConfig
+from backtest_v15.data import aggregate_1d_from_1h
+from backtest_v15.features import FeatureBuilder
+from backtest_v15.regime import RegimeEngine
+from backtest_v15.strategy_v15 import StrategyV15
+
+from .synthetic import synthetic_loader, synthetic_universe
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# a benchmark prepares its inputs from the scale's data and returns (timed function, bars processed)
+Bench = Callable[["Scale"], tuple[Callable[[], object], int]]
+
+
+class Scale:
+    """Synthetic inputs of one TICKERSxDAYS scale, built once and shared by all benchmarks."""
+
+    def __init__(self, tickers: int, days: int, seed: int):
+        self.tickers, self.days, self.seed = tickers, days, seed
+        self.frames_1h = synthetic_universe(tickers, days, seed=seed)
+        self.aggregator = BarAggregator(AggregationConfig())
+        self.bars_4h = self.aggregator.to_4h_many(self.frames_1h)
+        self.daily = {t: aggregate_1d_from_1h(df) for t, df in self.frames_1h.items()}
+        self.loader = synthetic_loader(self.frames_1h, seed=seed)
+        idx = pd.DatetimeIndex(np.concatenate([df.index.tz_localize(None).to_numpy() for df in self.frames_1h.values()]))
+        self.start, self.end = idx.min().date(), (idx.max() + pd.Timedelta(days=1)).date()
+
+    def n_1h(self) -> int:
+        return sum(len(df) for df in self.frames_1h.values())
+
+    def n_4h(self) -> int:
+        return sum(len(df) for df in self.bars_4h.values())
+
+
+def bench_aggregate_4h(s: Scale):
+    agg = s.aggregator
+    return (lambda: [agg.to_4h_session_aware(df) for df in s.frames_1h.values()]), s.n_1h()
+
+
+def bench_aggregate_4h_many(s: Scale):
+    return (lambda: s.aggregator.to_4h_many(s.frames_1h)), s.n_1h()
+
+
+def bench_feature_snapshot(s: Scale, per_ticker: int = 25):
+    fb = FeatureBuilder(StrategyConfig())
+    warm = fb._required_bars()
+    cases = [(df, i) for df in s.bars_4h.values() for i in np.linspace(warm, len(df) - 1, per_ticker).astype(int) if len(df) > warm]
+    return (lambda: [fb.snapshot(df, int(i)) for df, i in cases]), len(cases)
+
+
+def bench_weekly_regime(s: Scale):
+    eng = RegimeEngine(RegimeConfig(), s.loader)
+    return (lambda: eng.compute_weekly_regime(s.daily)), sum(len(d) for d in s.daily.values())
+
+
+def bench_strategy_evaluate(s: Scale):
+    cfg = StrategyConfig()
+    fb, strat, cat = FeatureBuilder(cfg), StrategyV15(cfg), CatalystEngine(s.loader)
+    inputs = []
+    for t, df in s.bars_4h.items():
+        cat.index_calendar(t, s.loader.get_calendar(t, s.start, s.end))
+        inputs.append((df, fb.build_frame(df), cat.catalyst_series(t, df.index)))
+
+    def run():
+        for df, frame, cats in inputs:
+            for i in range(len(df)):
+                strat.evaluate(df, i, fb.snapshot_at(frame, i), CatalystEngine.info_at(cats, i), in_position=False)
+    return run, s.n_4h()
+
+
+def _bench_backtest(engine: type[Backtester]) -> Bench:
+    def bench(s: Scale):
+        params = BacktestParams(start=s.start, end=s.end)
+
+        def run():
+            bt = engine(s.loader, AggregationConfig(), StrategyConfig(), SlippageConfig(), RiskConfig(), RegimeConfig())
+            return bt.run(s.bars_4h, s.daily, params)
+        return run, s.n_4h()
+    return bench
+
+
+BENCHES: dict[str, Bench] = {
+    "aggregate_4h": bench_aggregate_4h,
+    "aggregate_4h_many": bench_aggregate_4h_many,
+    "feature_snapshot": bench_feature_snapshot,
+    "weekly_regime": bench_weekly_regime,
+    "strategy_evaluate": bench_strategy_evaluate,
+    "backtest_run_loop": _bench_backtest(Backtester),
+    "backtest_run_columnar": _bench_backtest(ColumnarBacktester),
+}
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _peak_mb(fn: Callable[[], object]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def parse_scale(spec: str) -> tuple[int, int]:
+    try:
+        n, d = spec.lower().split("x")
+        return int(n), int(d)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scale must be TICKERSxDAYS, got {spec!r}")
+
+
+def run(scales: list[tuple[int, int]], names: list[str], repeat: int, seed: int, memory: bool) -> dict:
+    results = []
+    for n, days in scales:
+        t0 = time.perf_counter()
+        scale = Scale(n, days, seed)
+        print(f"scale {n}x{days}: {scale.n_1h()} 1H / {scale.n_4h()} 4H bars (generated in {time.perf_counter() - t0:.1f}s)", flush=True)
+        for name in names:
+            fn, bars = BENCHES[name](scale)
+            seconds = _time(fn, repeat)
+            row = {
+                "bench": name, "tickers": n, "days": days, "bars": bars,
+                "seconds": seconds, "bars_per_s": bars / seconds if seconds > 0 else None,
+                "peak_mb": _peak_mb(fn) if memory else None,
+            }
+            results.append(row)
+            mem = f"  peak {row['peak_mb']:.1f} MB" if memory else ""
+            print(f"  {name:<22} {seconds:8.3f}s  {row['bars_per_s']:12,.0f} bars/s{mem}", flush=True)
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(prog="benchmarks.bench", description="Time the backtest hot paths on synthetic OHLCV.")
+    p.add_argument("--scale", action="append", type=parse_scale, metavar="TICKERSxDAYS",
+                   help="Repeatable; default 10x250, 50x250 and 100x500.")
+    p.add_argument("--bench", action="append", choices=sorted(BENCHES), help="Repeatable; default all.")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass (peak memory).")
+    p.add_argument("--out", help="Output JSON path (default benchmarks/results/bench-<timestamp>.json).")
+    args = p.parse_args(argv)
+
+    # the benchmarks time the code, not the log handlers
+    logging.disable(logging.WARNING)
+    report = run(args.scale or [(10, 250), (50, 250), (100, 500)], args.bench or list(BENCHES), max(1, args.repeat), args.seed, not args.no_memory)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Parity checks of the streaming/batch code paths on synthetic data.
+
+    python -m benchmarks.check --tickers 5 --days 120
+
+Each check compares a path with the reference it must agree with on every
+ticker of the synthetic universe and raises AssertionError at the first
+difference, so the two implementations cannot drift apart unnoticed.
+"""
+from __future__ import annotations
+import argparse
+import logging
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from backtest_v15.aggregation import BarAggregator
+from backtest_v15.config import AggregationConfig
+from backtest_v15.structure import SwingTracker, detect_swings_close_only, is_hh_hl, last_higher_low_close
+
+from .synthetic import synthetic_universe
+
+# a check gets the 1H frames of the universe and their 4H bars
+Check = Callable[[dict[str, pd.DataFrame], dict[str, pd.DataFrame]], None]
+
+
+def _last_two(close: pd.Series, mask: pd.Series) -> list[tuple[int, float]]:
+    pos = np.flatnonzero(mask.to_numpy())[-2:]
+    return [(int(p), float(close.iloc[p])) for p in pos]
+
+
+def check_swing_tracker(frames_1h: dict[str, pd.DataFrame], bars_4h: dict[str, pd.DataFrame]) -> None:
+    """SwingTracker after bar i == detect_swings_close_only(close[:i+1]), incl. NaN closes and ties."""
+    for t, df in bars_4h.items():
+        close = df["close"].round(1)  # rounding makes equal closes (ties) in the pivot windows
+        close.iloc[len(close) // 3] = np.nan
+        tracker = SwingTracker()
+        for i, c in enumerate(close.to_numpy()):
+            tracker.update(c)
+            head = close.iloc[:i + 1]
+            sw = detect_swings_close_only(head)
+            assert list(tracker.highs) == _last_two(head, sw.swing_high), (t, i, "highs")
+            assert list(tracker.lows) == _last_two(head, sw.swing_low), (t, i, "lows")
+            assert tracker.hh_hl == is_hh_hl(head, swings=sw), (t, i, "hh_hl")
+            assert tracker.last_hl_close == last_higher_low_close(head, swings=sw), (t, i, "last_hl_close")
+
+
+def check_to_4h_many(frames_1h: dict[str, pd.DataFrame], bars_4h: dict[str, pd.DataFrame]) -> None:
+    """BarAggregator.to_4h_many == to_4h_session_aware per ticker, incl. inputs it hands to the single path."""
+    frames = dict(frames_1h)
+    t0, t1, t2 = list(frames_1h)[:3]
+    frames[t0] = frames[t0].assign(volume=frames[t0]["volume"].round().astype("int64"))  # int volume
+    frames[t1] = frames[t1].copy()
+    frames[t1].iloc[5] = np.nan  # NaN row
+    frames[t2] = frames[t2].tz_convert("UTC").tz_localize(None)  # naive UTC
+    frames["EMPTY"] = frames_1h[t0].iloc[0:0]
+    frames["NONE"] = None
+    aggregator = BarAggregator(AggregationConfig())
+    many = aggregator.to_4h_many(frames)
+    assert list(many) == list(frames)
+    for t, df in frames.items():
+        single = aggregator.to_4h_session_aware(df)
+        if single is None:
+            assert many[t] is None, t
+        else:
+            pd.testing.assert_frame_equal(many[t], single, obj=t)
+
+
+CHECKS: dict[str, Check] = {
+    "swing_tracker": check_swing_tracker,
+    "to_4h_many": check_to_4h_many,
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(prog="benchmarks.check", description="Parity checks of the backtest code paths on synthetic OHLCV.")
+    p.add_argument("--tickers", type=int, default=5)
+    p.add_argument("--days", type=int, default=120)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--check", action="append", choices=sorted(CHECKS), help="Repeatable; default all.")
+    args = p.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    frames_1h = synthetic_universe(args.tickers, args.days, seed=args.seed)
+    aggregator = BarAggregator(AggregationConfig())
+    bars_4h = {t: aggregator.to_4h_session_aware(df) for t, df in frames_1h.items()}
+    for name in args.check or list(CHECKS):
+        CHECKS[name](frames_1h, bars_4h)
+        print(f"  {name:<22} ok", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import zlib
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from backtest_v15.config import DataConfig
+from backtest_v15.data import FrameFetcher, YFDataLoader
+
+# yfinance-style 1H bars of the US regular session: 09:30 ... 15:30 (the last one is 30 min)
+SESSION_BARS = tuple(pd.Timedelta(hours=9, minutes=30) + pd.Timedelta(hours=k) for k in range(7))
+
+
+def ticker_seed(ticker: str, seed: int) -> int:
+    return zlib.crc32(ticker.encode("utf-8")) ^ (seed * 0x9E3779B1 & 0xFFFFFFFF)
+
+
+def synthetic_1h(
+        ticker: str,
+        days: int,
+        seed: int = 0,
+        end: str = "2025-06-30",
+        tz: str = "America/New_York",
+        missing_bar_frac: float = 0.01,
+        halt_day_frac: float = 0.005,
+        gap_sigma: float = 0.015,
+) -> pd.DataFrame:
+    """Deterministic 1H OHLCV of one ticker over `days` business days ending at `end`.
+
+    Session hours only, with overnight price gaps, whole missing days (halts)
+    and single missing bars, so aggregation and hygiene see the same holes as
+    with real yfinance data. Same (ticker, seed) -> same frame.
+    """
+    rng = np.random.default_rng(ticker_seed(ticker, seed))
+    sessions = pd.bdate_range(end=end, periods=days)
+    sessions = sessions[rng.random(len(sessions)) >= halt_day_frac]
+
+    n_bar = len(SESSION_BARS)
+    offsets = np.asarray([b.value for b in SESSION_BARS], dtype=np.int64)
+    wall = (sessions.as_unit("ns").asi8[:, None] + offsets[None, :]).ravel()
+    idx = pd.DatetimeIndex(wall).tz_localize(tz, nonexistent="shift_forward", ambiguous="NaT")
+
+    drift = rng.normal(0.0002, 0.0004)
+    vol = rng.uniform(0.004, 0.02)
+    ret = rng.normal(drift, vol, len(idx))
+    # overnight gap on the first bar of each session
+    ret[::n_bar] += rng.normal(0.0, gap_sigma, len(sessions))
+    close = rng.uniform(5.0, 300.0) * np.exp(np.cumsum(ret))
+    open_ = np.r_[close[0], close[:-1]] * np.exp(np.where(np.arange(len(idx)) % n_bar == 0, 0.0, rng.normal(0.0, vol / 4, len(idx))))
+    high = np.maximum(open_, close) * (1.0 + rng.exponential(vol / 2, len(idx)))
+    low = np.minimum(open_, close) * (1.0 - rng.exponential(vol / 2, len(idx)))
+    # U-shaped intraday volume profile
+    profile = np.array([2.0, 1.2, 0.9, 0.8, 0.9, 1.1, 1.8])
+    volume = np.round(rng.lognormal(np.log(rng.uniform(2e4, 2e6)), 0.5, len(idx)) * np.tile(profile, len(sessions)))
+
+    df = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": volume}, index=idx)
+    keep = (rng.random(len(df)) >= missing_bar_frac) & ~pd.isna(idx)
+    return df[keep]
+
+
+def synthetic_universe(n_tickers: int, days: int, seed: int = 0, **kwargs) -> dict[str, pd.DataFrame]:
+    """1H frames of n_tickers synthetic tickers SYN0000, SYN0001, ..."""
+    return {f"SYN{i:04d}": synthetic_1h(f"SYN{i:04d}", days, seed=seed, **kwargs) for i in range(n_tickers)}
+
+
+def synthetic_earnings(ticker: str, start: pd.Timestamp, end: pd.Timestamp, seed: int = 0) -> pd.DatetimeIndex:
+    """Quarterly earnings dates with a per-ticker phase and a few days of jitter."""
+    rng = np.random.default_rng(ticker_seed(ticker, seed) + 1)
+    first = pd.Timestamp(start).normalize() + pd.Timedelta(days=int(rng.integers(0, 91)))
+    n = int((pd.Timestamp(end) - first).days // 91) + 1
+    dates = [first + pd.Timedelta(days=91 * k + int(rng.integers(-5, 6))) for k in range(max(n, 0))]
+    return pd.DatetimeIndex([d for d in dates if pd.Timestamp(start) <= d <= pd.Timestamp(end)])
+
+
+@dataclass
+class SyntheticLoader(YFDataLoader):
+    """YFDataLoader serving synthetic 1H bars and earnings dates, without network or disk."""
+    frames: dict[str, pd.DataFrame] = field(default_factory=dict)
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        self.fetcher = FrameFetcher({(t, "1h"): df for t, df in self.frames.items()})
+        super().__post_init__()
+
+    def _fetch_earnings_dates(self, ticker: str) -> pd.DatetimeIndex:
+        df = self.frames.get(ticker)
+        if df is None or len(df) == 0:
+            return pd.DatetimeIndex([])
+        return synthetic_earnings(ticker, df.index[0].tz_localize(None), df.index[-1].tz_localize(None), seed=self.seed)
+
+
+def synthetic_loader(frames: dict[str, pd.DataFrame], seed: int = 0) -> SyntheticLoader:
+    return SyntheticLoader(DataConfig(cache_dir="", download_rate_per_s=0), frames=frames, seed=seed)
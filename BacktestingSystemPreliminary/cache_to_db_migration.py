@@ -1,29 +1,235 @@
+"""Migrate cached 1H parquet bars into the ohlcv_1h hypertable (see db_schma.py).
+
+    python cache_to_db_migration.py --cache-dir ./cache --workers 4
+
+Reads the store (cache/store/1h/<ticker>/ with its parquet parts listed in
+manifest.json, or a single cache/store/1h/<ticker>.parquet of the older
+layout) and the legacy cache files (cache/<ticker>__1h__<start>__<end>.parquet).
+Every source is streamed in Arrow record batches through binary COPY into a
+staging table and merged with one upsert (store bars overwrite, legacy files
+only fill missing bars), in one transaction per source that also records it in
+migration_progress. Sources run in parallel worker processes with one
+connection (and staging table) each; a rerun skips
+sources that are already recorded with the same size and mtime (of the
+manifest for store directories), so an interrupted migration resumes where it
+stopped.
+"""
+import argparse
+import glob
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
-import pyarrow
 import psycopg
 
+OHLCV = ("open", "high", "low", "close", "volume")
+PG_EPOCH_US = 946_684_800 * 10**6  # 2000-01-01 UTC, origin of binary timestamps
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+CREATE_PROGRESS = """
+CREATE TABLE IF NOT EXISTS migration_progress
+(
+    path        text PRIMARY KEY,
+    size        bigint           NOT NULL,
+    mtime       double precision NOT NULL,
+    rows        bigint           NOT NULL,
+    finished_at timestamptz      NOT NULL DEFAULT now()
+);
+"""
+CREATE_STAGE = """
+CREATE TEMP TABLE IF NOT EXISTS ohlcv_1h_stage
+(
+    seq      bigint,
+    datetime timestamptz,
+    ticker   text,
+    open     double precision,
+    high     double precision,
+    low      double precision,
+    close    double precision,
+    volume   double precision
+) ON COMMIT DELETE ROWS;
+"""
+COPY_STAGE = "COPY ohlcv_1h_stage (seq, datetime, ticker, open, high, low, close, volume) FROM STDIN (FORMAT BINARY)"
+# DISTINCT ON keeps the last row per key, ON CONFLICT needs each key once per statement
+MERGE = """
+INSERT INTO ohlcv_1h (datetime, ticker, open, high, low, close, volume)
+SELECT DISTINCT ON (datetime, ticker) datetime, ticker, open, high, low, close, volume
+FROM ohlcv_1h_stage
+ORDER BY datetime, ticker, seq DESC
+ON CONFLICT (datetime, ticker) {action}
+"""
+# store files are the consolidated, newest bars and overwrite; legacy files only fill holes,
+# so the result does not depend on the order in which parallel workers finish
+UPDATE = "DO UPDATE SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close, volume = EXCLUDED.volume"
+INSERT_TICKER = "INSERT INTO ticker(ticker, exchange, currency) VALUES (%s, %s, %s) ON CONFLICT (ticker) DO NOTHING"
+MARK_DONE = """
+INSERT INTO migration_progress(path, size, mtime, rows) VALUES (%s, %s, %s, %s)
+ON CONFLICT (path) DO UPDATE SET size = EXCLUDED.size, mtime = EXCLUDED.mtime, rows = EXCLUDED.rows, finished_at = now()
+"""
+
+
+def find_files(cache_dir: str) -> list[tuple[str, str, bool]]:
+    """(path, ticker, is_store) of every 1H store directory or parquet file and legacy cache file."""
+    out = []
+    store = os.path.join(glob.escape(cache_dir), "store", "1h")
+    for path in sorted(glob.glob(os.path.join(store, "*", "manifest.json"))):
+        path = os.path.dirname(path)
+        out.append((path, os.path.basename(path), True))
+    for path in sorted(glob.glob(os.path.join(store, "*.parquet"))):
+        out.append((path, os.path.basename(path)[: -len(".parquet")], True))
+    for path in sorted(glob.glob(os.path.join(glob.escape(cache_dir), "*__1h__*__*.parquet"))):
+        out.append((path, os.path.basename(path).split("__")[0], False))
+    return out
+
+
+def _stamp(path: str) -> tuple[int, float]:
+    """(size, mtime) that changes whenever the source does; a store directory changes with its manifest."""
+    st = os.stat(os.path.join(path, "manifest.json") if os.path.isdir(path) else path)
+    return st.st_size, st.st_mtime
+
+
+def _parquet_files(path: str) -> list[str]:
+    """The parquet files of a source, oldest first (later store parts win the merge)."""
+    if not os.path.isdir(path):
+        return [path]
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        return [os.path.join(path, part) for part in json.load(f)["parts"]]
+
+
+def _timestamp_column(schema: pa.Schema) -> str:
+    # pandas writes the DatetimeIndex as a column named after the index ("Datetime", "datetime", ...)
+    for f in schema:
+        if pa.types.is_timestamp(f.type):
+            return f.name
+    raise ValueError("no timestamp column")
+
+
+def _utc_us(col: pa.ChunkedArray | pa.Array, naive_tz: str) -> np.ndarray:
+    if col.type.tz is None:
+        col = pc.assume_timezone(col, naive_tz, ambiguous="earliest", nonexistent="earliest")
+    return pc.cast(col, pa.timestamp("us", "UTC")).to_numpy(zero_copy_only=False).astype("datetime64[us]").astype(np.int64)
+
+
+def copy_rows(seq: np.ndarray, ts_us: np.ndarray, ticker: bytes, cols: dict[str, np.ndarray]) -> bytes:
+    """Binary COPY rows (seq, datetime, ticker, OHLCV) built in one numpy buffer; nulls are sent as NaN."""
+    row = np.dtype(
+        [("nfields", ">i2"), ("len_seq", ">i4"), ("seq", ">i8"), ("len_ts", ">i4"), ("ts", ">i8"),
+         ("len_ticker", ">i4"), ("ticker", f"S{len(ticker)}")]
+        + [f for c in OHLCV for f in ((f"len_{c}", ">i4"), (c, ">f8"))]
+    )
+    rows = np.empty(len(ts_us), dtype=row)
+    rows["nfields"] = 8
+    rows["len_seq"], rows["seq"] = 8, seq
+    rows["len_ts"], rows["ts"] = 8, ts_us - PG_EPOCH_US
+    rows["len_ticker"], rows["ticker"] = len(ticker), ticker
+    for c in OHLCV:
+        rows[f"len_{c}"], rows[c] = 8, cols[c]
+    return rows.tobytes()
+
+
+# connection of this worker process, opened by _init_worker and reused for every source
+_DSN = ""
+_CONN = None
+
+
+def _connection():
+    global _CONN
+    if _CONN is None or _CONN.closed:
+        _CONN = psycopg.connect(_DSN)
+        _CONN.execute(CREATE_STAGE)
+        _CONN.commit()
+    return _CONN
+
+
+def _init_worker(dsn: str) -> None:
+    global _DSN
+    _DSN = dsn
+    _connection()
+
+
+def migrate_file(path: str, ticker: str, overwrite: bool, batch_rows: int, naive_tz: str, exchange: str, currency: str) -> tuple[str, int]:
+    """Stage, merge and record one source in a single transaction; returns (path, rows).
+
+    Rows without a timestamp are skipped.
+    """
+    size, mtime = _stamp(path)
+    tb = ticker.encode("utf-8")
+
+    rows = 0
+    conn = _connection()
+    # the staging table is emptied by the commit, or by the rollback if the source fails
+    with conn.transaction(), conn.cursor() as cur:
+        with cur.copy(COPY_STAGE) as copy:
+            copy.write(COPY_HEADER)
+            for file in _parquet_files(path):
+                pf = pq.ParquetFile(file)
+                names = {name.lower(): name for name in pf.schema_arrow.names}
+                ts_col = _timestamp_column(pf.schema_arrow)
+                columns = [ts_col] + [names[c] for c in OHLCV if c in names]
+                for batch in pf.iter_batches(batch_size=batch_rows, columns=columns):
+                    batch = batch.filter(pc.is_valid(batch.column(ts_col)))
+                    n = batch.num_rows
+                    cols = {}
+                    for c in OHLCV:
+                        if c in names:
+                            cols[c] = batch.column(names[c]).cast(pa.float64()).to_numpy(zero_copy_only=False)
+                        else:
+                            cols[c] = np.full(n, np.nan)
+                    ts = _utc_us(batch.column(ts_col), naive_tz)
+                    copy.write(copy_rows(np.arange(rows, rows + n, dtype=np.int64), ts, tb, cols))
+                    rows += n
+            copy.write(COPY_TRAILER)
+        cur.execute(MERGE.format(action=UPDATE if overwrite else "DO NOTHING"))
+        cur.execute(INSERT_TICKER, (ticker, exchange, currency))
+        cur.execute(MARK_DONE, (path, size, mtime, rows))
+    return path, rows
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Migrate the parquet OHLCV cache into the ohlcv_1h table.")
+    p.add_argument("--dsn", default="dbname=backtest_data user=postgres")
+    p.add_argument("--cache-dir", default="./cache/")
+    p.add_argument("--workers", type=int, default=4, help="Parallel worker processes (one connection each).")
+    p.add_argument("--batch-rows", type=int, default=100_000, help="Rows per Arrow record batch streamed into COPY.")
+    p.add_argument("--naive-tz", default="America/New_York", help="Timezone of timestamps stored without one.")
+    p.add_argument("--exchange", default="NASDAQ")
+    p.add_argument("--currency", default="usd")
+    p.add_argument("--restart", action="store_true", help="Ignore recorded progress and migrate every file again.")
+    args = p.parse_args()
+
+    files = find_files(args.cache_dir)
+    with psycopg.connect(args.dsn) as conn:
+        conn.execute(CREATE_PROGRESS)
+        done = {r[0]: (r[1], r[2]) for r in conn.execute("SELECT path, size, mtime FROM migration_progress")}
+        conn.commit()
+    if not args.restart:
+        files = [f for f in files if done.get(f[0]) != _stamp(f[0])]
+    print(f"{len(files)} files to migrate ({len(done)} recorded as done)")
+
+    t0, total, failed = time.time(), 0, 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker, initargs=(args.dsn,)) as ex:
+        futures = {
+            ex.submit(migrate_file, path, t, store, args.batch_rows, args.naive_tz, args.exchange, args.currency): path
+            for path, t, store in files
+        }
+        for k, fut in enumerate(as_completed(futures), 1):
+            try:
+                _, n = fut.result()
+                total += n
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {futures[fut]}: {e}")
+            if k % 50 == 0 or k == len(futures):
+                print(f"{k}/{len(futures)} files, {total} rows, {total / max(time.time() - t0, 1e-9):,.0f} rows/s")
+    if failed:
+        print(f"{failed} files failed; rerun to retry them")
+
 
-with psycopg.connect("dbname=backtest_data user=postgres") as conn:
-    with conn.cursor() as cursor:
-        base_path: str = "./cache/"
-        for file_name in os.listdir(base_path):
-            # load  and prepare data
-            apple_data: pyarrow.Table = pq.read_table(base_path + file_name)
-            open: list = apple_data.column(0).to_pylist()
-            high: list = apple_data.column(1).to_pylist()
-            low: list = apple_data.column(2).to_pylist()
-            close: list = apple_data.column(3).to_pylist()
-            volume: list = apple_data.column(4).to_pylist()
-            datetime: list = apple_data.column(5).to_pylist()
-            ticker: str = file_name.split("__")[0]
-            params: list[tuple] = [(dt, ticker, o, h, l, c, v) for dt, o, h, l, c, v in zip(datetime, open, high, low, close, volume)]
-
-            # save data
-            sql_insert_ohlcv_1h: str = "INSERT INTO ohlcv_1h(datetime, ticker, open, high, low, close, volume) VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT (datetime, ticker) DO NOTHING"
-            sql_insert_ticker: str = "INSERT INTO ticker(ticker, exchange, currency) VALUES (%s, %s, %s) ON CONFLICT (ticker) DO NOTHING"
-            cursor.execute(sql_insert_ticker, (ticker, "NASDAQ", "usd"))
-            cursor.executemany(sql_insert_ohlcv_1h, params)
-
-        conn.commit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()